@@ -1,92 +1,78 @@
 import os
-import xml.etree.ElementTree as ET
 from models import db
 from models.work import Work
 from flask import current_app
+from processors.eebo import read_header, extract_metadata
+from ingest_ledger import StageLedger, file_fingerprint
 import concurrent.futures
 import logging
-from datetime import datetime
-
-# Set up logging
-log_filename = f"eebo_import_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler()
-    ]
-)
+from script_logging import setup_logging, run_log_filename, worker_logging
+
 logger = logging.getLogger(__name__)
 
 
 def parse_eebo_metadata(xml_path):
     """Extract metadata from an EEBO-TCP XML file."""
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Find the teiHeader element
-        header = root.find('.//{http://www.tei-c.org/ns/1.0}teiHeader')
+        # Only the teiHeader is needed, so stop reading once it closes
+        header = read_header(xml_path)
         if header is None:
             return None
 
-        # Extract basic metadata
-        title_elem = header.find('.//{http://www.tei-c.org/ns/1.0}title')
-        title = ' '.join(title_elem.itertext()).strip() if title_elem is not None else "Unknown Title"
-
-        author_elem = header.find('.//{http://www.tei-c.org/ns/1.0}author')
-        author = ' '.join(author_elem.itertext()).strip() if author_elem is not None else None
-
-        # Extract TCP ID from filename
-        tcp_id = os.path.splitext(os.path.basename(xml_path))[0]
-
-        # Find publication date
-        date_elem = header.find('.//{http://www.tei-c.org/ns/1.0}date')
-        try:
-            pub_year = int(date_elem.get('when')) if date_elem is not None else None
-        except (ValueError, TypeError):
-            pub_year = None
-
-        return {
-            'title': title[:500],  # Truncate to match model field length
-            'author': author[:200] if author else None,
-            'publication_year': pub_year,
-            'tcp_id': tcp_id,
-            'file_path': xml_path,
-            'format': 'xml',
-            'collection': 'EEBO-TCP',
-            'language': 'eng'  # Default to English, could be extracted from metadata
-        }
+        return extract_metadata(header, xml_path)
     except Exception as e:
         logger.error(f"Error parsing {xml_path}: {str(e)}")
         return None
 
 
+def parse_eebo_metadata_with_fingerprint(xml_path):
+    """Extract metadata and the ledger fingerprint of a file in one worker call."""
+    metadata = parse_eebo_metadata(xml_path)
+    try:
+        fingerprint = file_fingerprint(xml_path)
+    except OSError:
+        fingerprint = None
+    return metadata, fingerprint
+
+
+def list_xml_files(directory):
+    """Return the paths of all XML files in a directory and its subdirectories."""
+    xml_files = []
+    for root, _, files in os.walk(directory):
+        xml_files.extend([os.path.join(root, f) for f in files if f.endswith('.xml')])
+    return xml_files
+
+
+def list_changed_files(directory, ledger):
+    """List the XML files under a directory that the ledger has not seen in their current state."""
+    xml_files = list_xml_files(directory)
+    changed = [xml_file for xml_file in xml_files if ledger.needs_processing(xml_file)]
+    logger.info(f"Found {len(xml_files)} XML files, {len(xml_files) - len(changed)} unchanged since last import")
+    return changed
+
+
 def process_directory(directory):
     """Process all XML files in a directory and its subdirectories."""
     logger.info(f"Starting to process directory: {directory}")
     processed = 0
     errors = 0
 
-    # Get list of all XML files
-    xml_files = []
-    for root, _, files in os.walk(directory):
-        xml_files.extend([os.path.join(root, f) for f in files if f.endswith('.xml')])
-
+    ledger = StageLedger('metadata')
+    xml_files = list_changed_files(directory, ledger)
     total_files = len(xml_files)
     logger.info(f"Found {total_files} XML files to process")
 
     # Process files in parallel
     with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_file = {executor.submit(parse_eebo_metadata, xml_file): xml_file
+        future_to_file = {executor.submit(parse_eebo_metadata_with_fingerprint, xml_file): xml_file
                           for xml_file in xml_files}
 
         for future in concurrent.futures.as_completed(future_to_file):
             xml_file = future_to_file[future]
             try:
-                metadata = future.result()
+                metadata, fingerprint = future.result()
                 if metadata:
+                    ledger.mark_done(xml_file, fingerprint=fingerprint)
                     # Check if work already exists
                     existing_work = Work.query.filter_by(tcp_id=metadata['tcp_id']).first()
                     if not existing_work:
@@ -95,7 +81,9 @@ def process_directory(directory):
                         processed += 1
                         # Commit every 100 records
                         if processed % 100 == 0:
+                            ledger.flush()
                             db.session.commit()
+                            ledger.committed()
                             logger.info(
                                 f"Processed {processed}/{total_files} files ({(processed / total_files) * 100:.1f}%)")
                 else:
@@ -106,25 +94,119 @@ def process_directory(directory):
 
     # Final commit
     try:
+        ledger.flush()
         db.session.commit()
+        ledger.committed()
     except Exception as e:
         logger.error(f"Error in final commit: {str(e)}")
         db.session.rollback()
+        ledger.discard()
 
     logger.info(f"Processing complete. Processed {processed} files with {errors} errors.")
     return processed, errors
 
 
+def process_directory_parallel(directory, workers=None, batch_size=5000):
+    """
+    Process all XML files on a process pool and bulk insert the new works.
+
+    Parsing runs on one process per CPU core by default. Existing TCP IDs are
+    loaded with a single query and new rows are written with executemany
+    inserts of ``batch_size`` rows, so the import is bound by CPU, not SQL.
+    """
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Starting to process directory: {directory} with {workers} processes")
+    processed = 0
+    skipped = 0
+    errors = 0
+
+    ledger = StageLedger('metadata')
+    xml_files = list_changed_files(directory, ledger)
+    total_files = len(xml_files)
+    logger.info(f"Found {total_files} XML files to process")
+
+    existing_ids = {tcp_id for (tcp_id,) in db.session.query(Work.tcp_id)}
+    logger.info(f"Loaded {len(existing_ids)} existing TCP IDs")
+
+    insert_stmt = Work.__table__.insert()
+    batch = []
+    done_files = []
+
+    def flush_batch():
+        try:
+            if batch:
+                db.session.execute(insert_stmt, batch)
+            for xml_file, fingerprint in done_files:
+                ledger.mark_done(xml_file, fingerprint=fingerprint)
+            ledger.flush()
+            db.session.commit()
+            ledger.committed()
+        except Exception as e:
+            logger.error(f"Error inserting batch of {len(batch)} works: {str(e)}")
+            db.session.rollback()
+            ledger.discard()
+            return 0, len(batch)
+        return len(batch), 0
+
+    chunksize = max(1, min(64, total_files // (workers * 4) or 1))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **worker_logging()) as executor:
+        results = executor.map(parse_eebo_metadata_with_fingerprint, xml_files, chunksize=chunksize)
+        for done, (xml_file, (metadata, fingerprint)) in enumerate(zip(xml_files, results), 1):
+            if not metadata:
+                errors += 1
+                continue
+
+            if metadata['tcp_id'] in existing_ids:
+                skipped += 1
+            else:
+                existing_ids.add(metadata['tcp_id'])
+                batch.append(metadata)
+            if fingerprint:
+                done_files.append((xml_file, fingerprint))
+
+            if len(batch) >= batch_size or len(done_files) >= batch_size:
+                inserted, failed = flush_batch()
+                processed += inserted
+                errors += failed
+                batch = []
+                done_files = []
+                logger.info(f"Processed {done}/{total_files} files ({(done / total_files) * 100:.1f}%)")
+
+    if batch or done_files:
+        inserted, failed = flush_batch()
+        processed += inserted
+        errors += failed
+
+    logger.info(f"Processing complete. Inserted {processed} works, skipped {skipped} existing, "
+                f"with {errors} errors.")
+    return processed, errors
+
+
 if __name__ == "__main__":
+    import argparse
     from app import app
 
+    setup_logging(run_log_filename('eebo_import'))
+
     EEBO_DIR = "/Volumes/seagate_portable/eebo-tcp-texts/tcp"
 
+    parser = argparse.ArgumentParser(description="Import EEBO-TCP metadata into the database")
+    parser.add_argument('--processes', action='store_true',
+                        help="Parse on a process pool and bulk insert new works")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="Rows per bulk insert in --processes mode")
+    args = parser.parse_args()
+
     if not os.path.exists(EEBO_DIR):
         logger.error(f"Directory not found: {EEBO_DIR}")
         exit(1)
 
     logger.info("Starting EEBO-TCP import process")
     with app.app_context():
-        process_directory(EEBO_DIR)
+        if args.processes:
+            process_directory_parallel(EEBO_DIR, workers=args.workers, batch_size=args.batch_size)
+        else:
+            process_directory(EEBO_DIR)
     logger.info("Import process completed")
\ No newline at end of file
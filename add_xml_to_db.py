@@ -1,18 +1,25 @@
 import os
-import xml.etree.ElementTree as ET
+from processors import xml_backend
+from processors.xml_processor import XMLProcessor
 from models import db
 from models.work import Work
+from storage import sources, render_cache
 
 # Define the directory containing the XML files
 XML_DIR = "/Users/a86136/desktop/plays/PlayShakespeare.com-XML/first_folio_editions"
 
+xml_processor = XMLProcessor()
+
 def parse_play(xml_path):
     """
     Extract minimal metadata from an XML play file.
     """
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+    return play_metadata(xml_backend.parse(xml_path), xml_path)
 
+def play_metadata(root, xml_path):
+    """
+    Extract minimal metadata from a parsed XML play.
+    """
     title_element = root.find('.//title')
     title = ' '.join(title_element.itertext()).strip() if title_element is not None else f"Unknown Title ({os.path.basename(xml_path)})"
 
@@ -33,6 +40,25 @@ def parse_play(xml_path):
         'notes': None
     }
 
+def precompute_play(work, root):
+    """Store the rendered structure of a play in the render cache, so its page never walks the XML."""
+    version = sources.version(work.id, work.file_path)
+    if version is None:
+        return
+    render_cache.put(work.id, version, xml_processor.process_play_content(root))
+
+def precompute_existing_plays():
+    """Refresh the precomputed structure of every play already in the database."""
+    with app.app_context():
+        plays = Work.query.filter_by(genre='Play').all()
+        for work in plays:
+            try:
+                print(f"Precomputing {work.title}...")
+                precompute_play(work, xml_backend.parse(work.file_path))
+            except Exception as e:
+                print(f"Error precomputing {work.file_path}: {e}")
+        print(f"Precomputed {len(plays)} plays")
+
 def populate_database():
     """Populate the database with XML file metadata."""
     xml_files = [f for f in os.listdir(XML_DIR) if f.endswith('.xml')]
@@ -43,14 +69,17 @@ def populate_database():
         print("Tables created successfully!")
 
         print("Populating database...")
+        parsed = []
         for xml_file in xml_files:
             try:
                 xml_path = os.path.join(XML_DIR, xml_file)
                 print(f"Parsing {xml_file}...")
-                work_data = parse_play(xml_path)
+                root = xml_backend.parse(xml_path)
+                work_data = play_metadata(root, xml_path)
 
                 work = Work(**work_data)
                 db.session.add(work)
+                parsed.append((work, root))
 
             except Exception as e:
                 print(f"Error processing {xml_file}: {e}")
@@ -58,6 +87,21 @@ def populate_database():
         db.session.commit()
         print("Database committed successfully!")
 
+        # Works have ids now, so the parsed plays can be cached under them
+        if not app.config.get('RENDER_CACHE_DIR'):
+            print("RENDER_CACHE_DIR is not set; precomputed plays will not outlive this process")
+        print("Precomputing play structures...")
+        for work, root in parsed:
+            try:
+                precompute_play(work, root)
+            except Exception as e:
+                print(f"Error precomputing {work.file_path}: {e}")
+        print("Play structures precomputed!")
+
 if __name__ == "__main__":
+    import sys
     from app import app
-    populate_database()
\ No newline at end of file
+    if '--precompute-only' in sys.argv:
+        precompute_existing_plays()
+    else:
+        populate_database()
\ No newline at end of file
@@ -1,19 +1,21 @@
 from flask import Flask
 from flask_migrate import Migrate
 from models import db
-from models.work import Work
+from models.work import Work, WorkSection
 from models.blog import BlogPost
 from models.user import User
+from models.ingest import IngestLedgerEntry, ReindexJob, ReindexFailure
 from routes import register_routes
 from routes.blog import register_blog_routes
 from routes.auth import register_auth_routes
 from routes.admin import register_admin_routes
 from routes.profile import register_profile_routes
-from commands import create_admin_command
+from commands import create_admin_command, build_snapshots_command
 from auth.oauth import oauth_handler
 from routes.forum import forum, init_forum_routes
 from flask_login import LoginManager, current_user
 from search import search
+from storage import sources, render_cache, snapshots
 
 app = Flask(__name__)
 
@@ -37,6 +39,9 @@ register_blog_routes(app)
 register_admin_routes(app)
 register_profile_routes(app)
 search.init_app(app)
+sources.init_app(app)
+render_cache.init_app(app)
+snapshots.init_app(app)
 
 # Register forum routes - fixed the double registration
 forum_blueprint = init_forum_routes(app)
@@ -52,6 +57,7 @@ def load_user(user_id):
 
 # Register commands
 app.cli.add_command(create_admin_command)
+app.cli.add_command(build_snapshots_command)
 
 # Add Content Security Policy (CSP) headers
 @app.after_request
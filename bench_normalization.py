@@ -0,0 +1,118 @@
+"""
+Benchmark the compiled normalizer against the original normalize_text.
+
+Text is extracted from EEBO-TCP files with the indexer's extractor, and
+normalized as whole documents, line by line and token by token, both
+directly and through a TokenNormalizer starting from an empty type map.
+Every result is checked against the original implementation, kept here
+as the reference.
+
+Usage: python bench_normalization.py [FILE_OR_DIR ...] [--limit N] [--repeat N]
+"""
+import os
+import time
+import argparse
+import unicodedata
+from normalization import normalizer, TokenNormalizer
+from processors.eebo import extract_source_text
+
+EEBO_DIR = "/Volumes/seagate_portable/eebo-tcp-texts/tcp"
+
+
+def legacy_normalize_text(text):
+    """normalize_text as it was before the compiled normalizer."""
+    if not text:
+        return text
+
+    # Convert to lowercase and remove diacritics
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.lower()
+
+    # Character substitutions
+    text = text.replace('j', 'i')
+    text = text.replace('v', 'u')
+    text = text.replace('ye', 'the')
+    text = text.replace('æ', 'ae')
+
+    # Common spelling variations
+    text = text.replace('tragedie', 'tragedy')
+    text = text.replace('comedie', 'comedy')
+    text = text.replace('historie', 'history')
+    text = text.replace('ſ', 's')  # long s
+    text = text.replace('haviour', 'havior')
+    text = text.replace('honour', 'honor')
+    text = text.replace('labour', 'labor')
+    text = text.replace('griefe', 'grief')
+    text = text.replace('loue', 'love')
+    text = text.replace('publike', 'public')
+    text = text.replace('musicke', 'music')
+    text = text.replace('magicke', 'magic')
+    text = text.replace('worke', 'work')
+    text = text.replace('booke', 'book')
+
+    return text
+
+
+def collect_files(paths, limit):
+    """Return up to ``limit`` XML files from the given paths, spread evenly over the sorted list."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith('.xml'))
+        else:
+            files.append(path)
+    files.sort()
+    if limit and len(files) > limit:
+        step = len(files) / limit
+        files = [files[int(i * step)] for i in range(limit)]
+    return files
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled normalizer with the original normalize_text")
+    parser.add_argument('paths', nargs='*', default=[EEBO_DIR], help="XML files or directories")
+    parser.add_argument('--limit', type=int, default=20, help="Number of files to sample")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the best is kept")
+    args = parser.parse_args()
+
+    documents = [text for text in (extract_source_text(path) for path in collect_files(args.paths, args.limit)) if text]
+    if not documents:
+        print("No text extracted")
+        return
+    # The indexer joins items with spaces, so sentences stand in for lines
+    lines = [line for document in documents for line in document.split('. ')]
+    tokens = [token for document in documents for token in document.split()]
+    size_mb = sum(len(document) for document in documents) / (1024 * 1024)
+    print(f"{len(documents)} documents, {len(lines)} lines, {len(tokens)} tokens, {size_mb:.1f} M characters")
+
+    cases = [
+        ('documents', documents),
+        ('lines', lines),
+        ('tokens', tokens),
+    ]
+    print(f"{'input':<10}{'legacy':>10}{'compiled':>10}{'batch':>10}{'types':>10}{'speedup':>10}  equivalent")
+    for name, texts in cases:
+        legacy_time, expected = best_time(lambda: [legacy_normalize_text(text) for text in texts], args.repeat)
+        compiled_time, compiled = best_time(lambda: [normalizer.normalize(text) for text in texts], args.repeat)
+        batch_time, batch = best_time(lambda: normalizer.normalize_many(texts), args.repeat)
+        types_time, typed = best_time(lambda: TokenNormalizer().normalize_many(texts), args.repeat)
+        mismatches = sum(sum(a != b for a, b in zip(expected, result)) for result in (compiled, batch, typed))
+        print(f"{name:<10}{legacy_time:>9.3f}s{compiled_time:>9.3f}s{batch_time:>9.3f}s{types_time:>9.3f}s"
+              f"{legacy_time / min(compiled_time, batch_time, types_time):>9.2f}x  "
+              f"{'yes' if not mismatches else f'NO ({mismatches} differ)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark the lxml and stdlib XML backends on EEBO-TCP files.
+
+Files are read into memory first, so only parsing is timed. Each stage is
+timed on every file, keeping the best of ``--repeat`` runs:
+
+- parse:  build the full tree
+- header: stream the teiHeader only (add_eebo_to_db.py, publication years)
+- ingest: parse, extract metadata and body text (ingest_eebo.py)
+
+Usage: python bench_xml_backend.py [FILE_OR_DIR ...] [--limit N] [--repeat N]
+"""
+import io
+import os
+import time
+import argparse
+from processors import eebo, xml_backend
+
+EEBO_DIR = "/Volumes/seagate_portable/eebo-tcp-texts/tcp"
+
+
+def collect_files(paths, limit):
+    """Return up to ``limit`` XML files from the given paths, spread evenly over the sorted list."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith('.xml'))
+        else:
+            files.append(path)
+    files.sort()
+    if limit and len(files) > limit:
+        step = len(files) / limit
+        files = [files[int(i * step)] for i in range(limit)]
+    return files
+
+
+def parse_stage(path, data):
+    xml_backend.fromstring(data)
+
+
+def header_stage(path, data):
+    eebo.read_header(io.BytesIO(data))
+
+
+def ingest_stage(path, data):
+    root = xml_backend.fromstring(data)
+    header = eebo.find_header(root)
+    if header is not None:
+        eebo.extract_metadata(header, path)
+        eebo.extract_publication_year(header)
+    eebo.extract_body_text(root)
+
+
+STAGES = [('parse', parse_stage), ('header', header_stage), ('ingest', ingest_stage)]
+
+
+def run(corpus, stage, repeat):
+    """Return the total of the best time per file for one stage, in seconds."""
+    total = 0.0
+    for path, data in corpus:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stage(path, data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        total += best
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the lxml and stdlib XML backends on EEBO-TCP files")
+    parser.add_argument('paths', nargs='*', default=[EEBO_DIR], help="XML files or directories")
+    parser.add_argument('--limit', type=int, default=200, help="Number of files to sample")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per file; the best is kept")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths, args.limit)
+    if not files:
+        print("No XML files found")
+        return
+    corpus = []
+    for path in files:
+        with open(path, 'rb') as f:
+            corpus.append((path, f.read()))
+    size_mb = sum(len(data) for _, data in corpus) / (1024 * 1024)
+    print(f"{len(corpus)} files, {size_mb:.1f} MB")
+
+    backends = ['stdlib'] + (['lxml'] if xml_backend.etree is not None else [])
+    if len(backends) == 1:
+        print("lxml is not installed; timing the stdlib backend only")
+
+    results = {}
+    for name in backends:
+        xml_backend.set_backend(name)
+        for stage_name, stage in STAGES:
+            results[name, stage_name] = run(corpus, stage, args.repeat)
+
+    print(f"{'stage':<8}" + ''.join(f"{name:>12}" for name in backends) + ("     speedup" if len(backends) > 1 else ""))
+    for stage_name, _ in STAGES:
+        row = f"{stage_name:<8}" + ''.join(f"{results[name, stage_name]:>11.3f}s" for name in backends)
+        if len(backends) > 1:
+            row += f"{results['stdlib', stage_name] / results['lxml', stage_name]:>11.2f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,58 @@ def create_admin_command(username, email, password):
     user.set_password(password)
     db.session.add(user)
     db.session.commit()
-    click.echo(f'Created admin user: {username}')
\ No newline at end of file
+    click.echo(f'Created admin user: {username}')
+
+@click.command('build-snapshots')
+@click.option('--collection', default=None, help='Only build snapshots for this collection')
+@click.option('--force', is_flag=True, help='Rebuild snapshots that are already current')
+@with_appcontext
+def build_snapshots_command(collection, force):
+    """Pre-render work pages into precompressed static snapshots"""
+    from flask import current_app
+    from models.work import Work
+    from routes.main import work_etag
+    from storage import snapshots
+
+    if not snapshots.directory:
+        raise click.ClickException('SNAPSHOT_DIR is not configured')
+
+    client = current_app.test_client()
+    built = current = failed = 0
+    last_id = 0
+    while True:
+        query = Work.query.filter(Work.id > last_id)
+        if collection:
+            query = query.filter_by(collection=collection)
+        works = query.order_by(Work.id).limit(500).all()
+        if not works:
+            break
+        last_id = works[-1].id
+
+        for work in works:
+            url = f'/work/{work.id}'
+            # Snapshots are the page an anonymous reader gets
+            with current_app.test_request_context(url):
+                etag = work_etag(work)
+            if etag is None:
+                failed += 1
+                continue
+            # Current only if stored in every encoding this build writes, e.g. br once brotli is installed
+            if not force and set(snapshots.encodings(work.id, etag)) >= set(snapshots.written_encodings()):
+                current += 1
+                continue
+
+            # Ask for an uncompressed page so it is rendered live, not served from a snapshot
+            response = client.get(url, headers={'Accept-Encoding': 'identity'})
+            etag = response.get_etag()[0]
+            if response.status_code != 200 or not etag:
+                click.echo(f'Could not render work {work.id}: HTTP {response.status_code}')
+                failed += 1
+                continue
+            snapshots.write(work.id, etag, response.get_data())
+            built += 1
+
+        db.session.expunge_all()
+        click.echo(f'Built {built} snapshots, {current} already current, {failed} failed')
+
+    click.echo(f'Done: built {built} snapshots, {current} already current, {failed} failed')
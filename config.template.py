@@ -3,6 +3,35 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///path/to/your/database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Compressed store of extracted work text, shared by indexing and analytics
+    TEXT_STORE_PATH = 'instance/text_store/texts'
+
+    # Packed corpus XML built by pack_corpus.py; unset to read Work.file_path directly
+    CORPUS_ARCHIVE_PATH = 'instance/corpus_archive/corpus'
+    # Stat each packed work's file and read it from disk if edited since packing
+    CORPUS_ARCHIVE_VERIFY_FILES = False
+
+    # Processed work structures: in-process LRU size and shared on-disk directory
+    RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RENDER_CACHE_DIR = 'instance/render_cache'
+
+    # Part of every work page ETag; bump it when work templates change
+    TEMPLATE_VERSION = '1'
+    # Seconds a front proxy or browser may reuse a work page without revalidating
+    WORK_CACHE_MAX_AGE = 3600
+
+    # Precompressed work page snapshots built by `flask build-snapshots` (.gz, plus .br when
+    # brotli is installed); unset to always render live
+    SNAPSHOT_DIR = 'instance/snapshots'
+    # Internal nginx location aliased to SNAPSHOT_DIR; when set, snapshots are sent with
+    # X-Accel-Redirect (the location must set Content-Encoding from the .gz/.br extension itself)
+    SNAPSHOT_ACCEL_PREFIX = None
+
+    # Spelling variant synonyms written by mine_variants.py, read when a search index is created
+    VARIANT_SYNONYMS_PATH = 'instance/variant_synonyms.txt'
+    # Learned spelling -> normalized form map, so token normalization starts warm
+    NORMALIZATION_TYPE_MAP = 'instance/normalization_types.json.z'
+
     # Security
     SECRET_KEY = 'your-secret-key-here'
 
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import concurrent.futures
+from models import db
+from models.work import Work
+from processors.eebo import scan_sections
+from ingest_ledger import StageLedger
+from section_index import save_sections
+from storage import resolver_for
+import logging
+from script_logging import setup_logging, run_log_filename, worker_logging
+
+logger = logging.getLogger(__name__)
+
+
+def scan_work(work_id, file_path, archive_path=None):
+    """
+    Return (version, sections, fingerprint, error) for a work's source; runs in a worker process.
+
+    The ledger fingerprint is taken from the bytes scanned, so the main
+    process never reads or hashes the file; it is None when there is no
+    file on disk, only its packed copy.
+    """
+    try:
+        resolver = resolver_for(archive_path)
+        version = resolver.version(work_id, file_path)
+        data = resolver.read(work_id, file_path)
+        if version is None or data is None:
+            return None, None, None, f"File not found: {file_path}"
+        try:
+            stat = os.stat(file_path)
+            fingerprint = (stat.st_size, stat.st_mtime, hashlib.sha1(data).hexdigest())
+        except OSError:
+            fingerprint = None
+        return version, scan_sections(data), fingerprint, None
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+def build_section_index(app, workers=None, batch_size=1000):
+    """
+    Record the byte range of every top-level body <div> of each EEBO-TCP work.
+
+    Sources are scanned with expat on a process pool. Works whose file the
+    ledger has already scanned in its current state are skipped.
+    """
+    workers = workers or os.cpu_count() or 1
+    with app.app_context():
+        ledger = StageLedger('sections')
+        archive_path = app.config.get('CORPUS_ARCHIVE_PATH')
+        indexed = 0
+        unchanged = 0
+        errors = 0
+        last_id = 0
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **worker_logging()) as executor:
+            while True:
+                rows = db.session.query(Work.id, Work.file_path) \
+                    .filter(Work.collection == 'EEBO-TCP', Work.id > last_id) \
+                    .order_by(Work.id).limit(batch_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                works = []
+                for work_id, file_path in rows:
+                    if os.path.exists(file_path) and not ledger.needs_processing(file_path):
+                        unchanged += 1
+                    else:
+                        works.append((work_id, file_path))
+
+                results = executor.map(scan_work,
+                                       [work_id for work_id, _ in works],
+                                       [file_path for _, file_path in works],
+                                       [archive_path] * len(works),
+                                       chunksize=max(1, len(works) // (workers * 4)))
+                for (work_id, file_path), (version, sections, fingerprint, error) in zip(works, results):
+                    if error:
+                        logger.error(f"Error scanning work {work_id}: {error}")
+                        errors += 1
+                        continue
+                    save_sections(work_id, version, sections)
+                    if fingerprint:
+                        ledger.mark_done(file_path, work_id=work_id, fingerprint=fingerprint)
+                    indexed += 1
+
+                try:
+                    ledger.flush()
+                    db.session.commit()
+                    ledger.committed()
+                except Exception as e:
+                    logger.error(f"Error committing section index batch: {str(e)}")
+                    db.session.rollback()
+                    ledger.discard()
+                logger.info(f"Indexed sections of {indexed} works so far "
+                            f"({unchanged} unchanged, {errors} errors)")
+
+        logger.info(f"Section indexing complete. {indexed} works indexed, "
+                    f"{unchanged} unchanged, {errors} errors")
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    setup_logging(run_log_filename('section_index'))
+
+    parser = argparse.ArgumentParser(description="Index the byte ranges of top-level sections in EEBO-TCP works")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of scanning processes (defaults to the CPU count)")
+    args = parser.parse_args()
+
+    build_section_index(app, workers=args.workers)
@@ -1,137 +1,358 @@
 import os
-import xml.etree.ElementTree as ET
 from flask import current_app
 from models import db
 from models.work import Work
 from search import search
+from processors.eebo import extract_source_text
+from normalization import normalize_text
+from models.ingest import ReindexJob, ReindexFailure
+from ingest_ledger import StageLedger, file_fingerprint
+from storage import TextStore, resolver_for
 import logging
+from script_logging import setup_logging, run_log_filename, worker_logging
 from datetime import datetime
 import concurrent.futures
-import functools
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'indexing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
-        logging.StreamHandler()
-    ]
-)
+from collections import deque
+
 logger = logging.getLogger(__name__)
 
+# Text stores opened by extraction worker processes, by path
+_text_stores = {}
+
 
 def extract_text_from_xml(xml_path):
-    """Extract full text content from XML file."""
+    """Extract full text content from an XML file path or binary file object."""
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
+        return extract_source_text(xml_path)
+    except Exception as e:
+        logger.error(f"Error processing {xml_path}: {str(e)}")
+        return ""
 
-        # Handle different XML formats
-        if 'tei-c.org' in str(root.tag):  # EEBO-TCP format
-            # Extract text from body
-            body = root.find('.//{http://www.tei-c.org/ns/1.0}body')
-            if body is None:
-                return ""
 
-            # Join all text elements, preserving some structure
-            text_parts = []
-            for elem in body.iter():
-                if elem.text and elem.text.strip():
-                    text_parts.append(elem.text.strip())
+def extract_work_text(work_id, xml_path, store_path=None, archive_path=None):
+    """
+    Return (content, normalized, fingerprint, checksum, cached) for a work; runs in a worker process.
 
-            return " ".join(text_parts)
-        else:  # Shakespeare play format
-            text_parts = []
+    Works in the corpus archive are read from it and identified by the
+    checksum recorded there; other works are read and fingerprinted on disk.
+    When a text store is configured, text already extracted from the same
+    version of the source is read from the store instead of parsing the XML.
+    The content is normalized for the content_normalized search field here,
+    so the indexing process only has to serialize it.
+    """
+    sources = resolver_for(archive_path)
+    fingerprint = None
+    checksum = sources.checksum(work_id, xml_path)
+    if checksum is None:
+        try:
+            fingerprint = file_fingerprint(xml_path)
+        except OSError as e:
+            logger.error(f"Error reading {xml_path}: {str(e)}")
+            return "", "", None, None, False
+        checksum = fingerprint[2]
 
-            # Extract speeches
-            for speech in root.findall('.//speech'):
-                speaker = speech.find('speaker')
-                if speaker is not None:
-                    text_parts.append(speaker.text)
+    if store_path:
+        store = _text_stores.get(store_path)
+        if store is None:
+            store = _text_stores[store_path] = TextStore(store_path)
+        try:
+            content = store.get(work_id, checksum=checksum)
+        except Exception as e:
+            # A damaged entry is parsed again from the source, and the fresh text replaces it
+            logger.error(f"Error reading stored text of work {work_id}: {str(e)}")
+            content = None
+        if content is not None:
+            return content, normalize_text(content), fingerprint, checksum, True
 
-                for line in speech.findall('line'):
-                    text_parts.append(''.join(line.itertext()))
+    with sources.open(work_id, xml_path) as source:
+        content = extract_text_from_xml(source)
+    return content, normalize_text(content), fingerprint, checksum, False
 
-            # Extract stage directions
-            for stagedir in root.findall('.//stagedir'):
-                text_parts.append(stagedir.text)
 
-            return " ".join(text_parts)
+def iter_works(batch_size=1000, after_id=0):
+    """Yield all works in id order, paging with keyset pagination on Work.id."""
+    last_id = after_id
+    while True:
+        works = Work.query.filter(Work.id > last_id).order_by(Work.id).limit(batch_size).all()
+        if not works:
+            return
 
-    except Exception as e:
-        logger.error(f"Error processing {xml_path}: {str(e)}")
-        return ""
+        for work in works:
+            # Detach so ledger commits don't expire works still in the pipeline
+            db.session.expunge(work)
+            yield work
+        last_id = works[-1].id
 
 
-def index_work_with_context(app, work):
-    """Index a single work into Elasticsearch with app context."""
-    with app.app_context():
+def iter_failed_works(job, batch_size=1000):
+    """Yield the works recorded as failed in a reindex job, in id order."""
+    work_ids = sorted(work_id for (work_id,) in
+                      db.session.query(ReindexFailure.work_id).filter_by(job_id=job.id))
+    for i in range(0, len(work_ids), batch_size):
+        works = Work.query.filter(Work.id.in_(work_ids[i:i + batch_size])).order_by(Work.id).all()
+        for work in works:
+            db.session.expunge(work)
+            yield work
+
+
+class ReindexProgress:
+    """
+    Tracks a reindex job: counts, ledger entries, failures and the resume checkpoint.
+
+    Works finish out of order, so the checkpoint is a low watermark: the
+    highest Work.id such that it and every work before it has either been
+    indexed, skipped as unchanged or recorded in the failure table.
+    """
+
+    def __init__(self, job, ledger, total, retrying=False, checkpoint_every=500):
+        self.job = job
+        self.ledger = ledger
+        self.total = total
+        self.retrying = retrying
+        # Rebuilds and retries index every work they are given
+        self.use_ledger = not (retrying or job.index_name)
+        self.checkpoint_every = checkpoint_every
+        self.failures = {failure.work_id: failure for failure in job.failures}
+        self.watermark = job.last_work_id
+        self.base_indexed = job.indexed_count
+        self.pending = deque()
+        self.completed = set()
+        self.works = {}
+        self.fingerprints = {}
+        self.successful = 0
+        self.failed = 0
+        self.unchanged = 0
+
+    def mark_submitted(self, work):
+        self.pending.append(work.id)
+        self.works[work.id] = work
+
+    def mark_skipped(self, work):
+        """Record a work whose source file hasn't changed since it was last indexed."""
+        self.unchanged += 1
+        self._clear_failure(work.id)
+        self._complete(work.id)
+
+    def mark_extracted(self, work, fingerprint):
+        self.fingerprints[work.id] = fingerprint
+
+    def mark_indexed(self, work_id):
+        work = self.works[work_id]
+        fingerprint = self.fingerprints.get(work_id)
+        # Works read from the corpus archive may have no file on disk to record
+        if fingerprint or os.path.exists(work.file_path):
+            self.ledger.mark_done(work.file_path, work_id=work.id, fingerprint=fingerprint)
+        self.successful += 1
+        self._clear_failure(work_id)
+        self._complete(work_id)
+
+    def mark_failed(self, work_id, error):
+        self.failed += 1
+        failure = self.failures.get(work_id)
+        if failure is None:
+            failure = ReindexFailure(job_id=self.job.id, work_id=work_id, error=error)
+            db.session.add(failure)
+            self.failures[work_id] = failure
+        else:
+            failure.error = error
+            failure.attempts += 1
+        self._complete(work_id)
+
+    def _clear_failure(self, work_id):
+        failure = self.failures.pop(work_id, None)
+        if failure is not None:
+            db.session.delete(failure)
+
+    def _complete(self, work_id):
+        self.works.pop(work_id, None)
+        self.fingerprints.pop(work_id, None)
+        self.completed.add(work_id)
+        while self.pending and self.pending[0] in self.completed:
+            self.completed.discard(self.pending[0])
+            self.watermark = self.pending.popleft()
+
+        done = self.successful + self.failed + self.unchanged
+        if done % self.checkpoint_every == 0:
+            self.checkpoint()
+            logger.info(f"Progress: {done / self.total * 100:.1f}% ({self.successful} succeeded, "
+                        f"{self.failed} failed, {self.unchanged} unchanged)")
+
+    def checkpoint(self, status=None):
+        """Persist the ledger, the failure table and the job's resume point in one commit."""
         try:
-            if not os.path.exists(work.file_path):
-                logger.error(f"File not found: {work.file_path}")
-                return False
+            self.ledger.flush()
+            if not self.retrying:
+                self.job.last_work_id = self.watermark
+            self.job.indexed_count = self.base_indexed + self.successful
+            self.job.failed_count = len(self.failures)
+            if status:
+                self.job.status = status
+                if status == 'completed':
+                    self.job.finished_at = datetime.utcnow()
+            db.session.commit()
+            self.ledger.committed()
+        except Exception as e:
+            logger.error(f"Error saving reindex checkpoint: {str(e)}")
+            db.session.rollback()
+            self.ledger.discard()
+
+
+def extract_works(executor, works, progress, max_in_flight, text_store=None, archive_path=None):
+    """
+    Extract content for works on a process pool, yielding (work, content, normalized) as each finishes.
 
-            # Extract text content
-            content = extract_text_from_xml(work.file_path)
-            if not content:
+    The pool is kept fed with up to ``max_in_flight`` files at a time, so it
+    never drains between pages of works. Newly extracted text is saved to
+    ``text_store`` so later runs can skip the XML parse.
+    """
+    store_path = text_store.path if text_store else None
+    in_flight = {}
+
+    def finished(futures):
+        for future in futures:
+            work = in_flight.pop(future)
+            try:
+                content, normalized, fingerprint, checksum, cached = future.result()
+            except Exception as e:
+                logger.error(f"Error extracting work {work.id}: {str(e)}")
+                content = None
+
+            if content and progress.use_ledger and progress.ledger.unchanged(work.file_path, fingerprint):
+                # Touched but identical to what was last indexed
+                progress.mark_skipped(work)
+            elif content:
+                progress.mark_extracted(work, fingerprint)
+                if text_store is not None and not cached:
+                    text_store.put(work.id, content, checksum)
+                yield work, content, normalized
+            else:
                 logger.error(f"No content extracted from {work.file_path}")
-                return False
+                progress.mark_failed(work.id, f"No content extracted from {work.file_path}")
 
-            # Index the work
-            success = search.index_work(work, content)
-            if success:
-                logger.info(f"Successfully indexed work {work.id}: {work.title}")
-            return success
+    for work in works:
+        progress.mark_submitted(work)
 
-        except Exception as e:
-            logger.error(f"Error indexing work {work.id}: {str(e)}")
-            return False
+        # Skip works whose source file hasn't changed since it was last indexed
+        if progress.use_ledger and os.path.exists(work.file_path) \
+                and not progress.ledger.needs_processing(work.file_path):
+            progress.mark_skipped(work)
+            continue
+
+        if len(in_flight) >= max_in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from finished(done)
+
+        future = executor.submit(extract_work_text, work.id, work.file_path, store_path, archive_path)
+        in_flight[future] = work
 
+    yield from finished(list(concurrent.futures.as_completed(in_flight)))
 
-def index_all_works(app):
-    """Index all works in the database into Elasticsearch."""
+
+def get_job(resume=False, retry_failed=False, rebuild=False):
+    """Start a new reindex job, or load the one to resume or retry."""
+    if not (resume or retry_failed):
+        job = ReindexJob()
+        if rebuild:
+            job.index_name = search.create_index_version(current_app.config['ELASTICSEARCH_INDEX'])
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    query = ReindexJob.query
+    if resume:
+        query = query.filter(ReindexJob.status != 'completed')
+    return query.order_by(ReindexJob.id.desc()).first()
+
+
+def index_all_works(app, workers=None, resume=False, retry_failed=False, rebuild=False):
+    """
+    Index all works in the database into Elasticsearch.
+
+    Works are paged by id, extracted on a process pool with one process per
+    core by default, and streamed into bulk indexing while extraction of
+    later works continues. Progress is checkpointed in a ReindexJob so an
+    interrupted run can be resumed with ``resume``, and works that failed
+    are kept in a failure table that ``retry_failed`` reprocesses alone.
+
+    With ``rebuild`` every work is indexed into a new index version with
+    refresh and replicas off, and the alias is swapped to it once the job
+    completes, so searches are served from the old index until then.
+    """
+    workers = workers or os.cpu_count() or 1
     with app.app_context():
-        # Get total count
-        total_works = Work.query.count()
-        logger.info(f"Starting indexing of {total_works} works")
+        job = get_job(resume=resume, retry_failed=retry_failed, rebuild=rebuild)
+        if job is None:
+            logger.error("No reindex job found to resume or retry")
+            return
 
-        # Process works in batches to manage memory
-        batch_size = 100
-        successful = 0
-        failed = 0
+        if retry_failed:
+            total_works = job.failures.count()
+            works = iter_failed_works(job)
+            logger.info(f"Retrying {total_works} failed works from reindex job {job.id}")
+        else:
+            total_works = Work.query.filter(Work.id > job.last_work_id).count()
+            works = iter_works(after_id=job.last_work_id)
+            logger.info(f"{'Resuming' if resume else 'Starting'} reindex job {job.id} "
+                        f"after work {job.last_work_id}: {total_works} works remaining")
+        if job.index_name:
+            logger.info(f"Indexing into {job.index_name}")
+        logger.info(f"Using {workers} extraction processes")
 
-        # Create a partial function with the app argument
-        index_work_partial = functools.partial(index_work_with_context, app)
+        progress = ReindexProgress(job, StageLedger('index'), max(total_works, 1), retrying=retry_failed)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            for offset in range(0, total_works, batch_size):
-                works = Work.query.offset(offset).limit(batch_size).all()
+        def record_result(work_id, error):
+            if error is None:
+                progress.mark_indexed(work_id)
+            else:
+                progress.mark_failed(work_id, error)
 
-                # Submit batch of works for indexing
-                future_to_work = {executor.submit(index_work_partial, work): work for work in works}
+        store_path = app.config.get('TEXT_STORE_PATH')
+        text_store = TextStore(store_path) if store_path else None
 
-                # Process completed tasks
-                for future in concurrent.futures.as_completed(future_to_work):
-                    work = future_to_work[future]
-                    try:
-                        if future.result():
-                            successful += 1
-                        else:
-                            failed += 1
-                    except Exception as e:
-                        logger.error(f"Error processing work {work.id}: {str(e)}")
-                        failed += 1
+        # An interrupted run keeps its 'running' status so it can be resumed
+        status = None
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **worker_logging()) as executor:
+                docs = extract_works(executor, works, progress, workers * 4, text_store=text_store,
+                                     archive_path=app.config.get('CORPUS_ARCHIVE_PATH'))
+                search.bulk_index(docs, index=job.index_name, on_result=record_result)
+            if not retry_failed:
+                status = 'completed'
+        except Exception as e:
+            logger.error(f"Reindex job {job.id} failed: {str(e)}")
+            status = 'failed'
+            raise
+        finally:
+            progress.checkpoint(status=status)
+            if text_store is not None:
+                text_store.close()
 
-                # Log progress
-                progress = (offset + len(works)) / total_works * 100
-                logger.info(f"Progress: {progress:.1f}% ({successful} succeeded, {failed} failed)")
+            logger.info(f"Indexing stopped. {progress.successful} works indexed successfully, "
+                        f"{progress.failed} failed, {progress.unchanged} skipped as unchanged. "
+                        f"{len(progress.failures)} works are queued for --retry-failed")
 
-        logger.info(f"Indexing complete. {successful} works indexed successfully, {failed} failed")
+        if job.index_name and not retry_failed:
+            search.finish_index_version(current_app.config['ELASTICSEARCH_INDEX'], job.index_name)
 
 
 if __name__ == "__main__":
+    import argparse
     from app import app
+
+    setup_logging(run_log_filename('indexing'))
+
+    parser = argparse.ArgumentParser(description="Index all works into Elasticsearch")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of extraction processes (defaults to the CPU count)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume the last unfinished reindex job from its checkpoint")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Only reindex the works that failed in the last reindex job")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Rebuild into a new index version and swap the alias when done")
+    args = parser.parse_args()
+
     logger.info("Starting indexing process")
-    index_all_works(app)
-    logger.info("Indexing process finished")
\ No newline at end of file
+    index_all_works(app, workers=args.workers, resume=args.resume, retry_failed=args.retry_failed,
+                    rebuild=args.rebuild)
+    logger.info("Indexing process finished")
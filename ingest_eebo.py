@@ -0,0 +1,224 @@
+import os
+from models import db
+from models.work import Work
+from processors.eebo import scan_eebo_data
+from search import search
+from ingest_ledger import StageLedger, read_with_fingerprint
+from section_index import save_sections
+from storage import TextStore, sources
+from flask import current_app
+import concurrent.futures
+import logging
+from datetime import datetime
+
+# Set up logging
+log_filename = f"eebo_ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_filename),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+EEBO_DIR = "/Volumes/seagate_portable/eebo-tcp-texts/tcp"
+
+# Threads parsing files; four times as many files are kept in flight
+PARSE_WORKERS = 4
+
+
+def parse_file(xml_path):
+    """
+    Parse, fingerprint and section-scan a single EEBO-TCP file, logging instead of raising on errors.
+
+    The file is read once and parsed once: a single expat pass over its
+    bytes gives the header, the body text and the section offsets, and the
+    same bytes are hashed.
+    """
+    try:
+        data, fingerprint = read_with_fingerprint(xml_path)
+        parsed, sections = scan_eebo_data(xml_path, data)
+        return parsed, fingerprint, sections
+    except Exception as e:
+        logger.error(f"Error parsing {xml_path}: {str(e)}")
+        return None, None, None
+
+
+def store_work(metadata):
+    """Insert a new Work or refresh the publication year of an existing one."""
+    work = Work.query.filter_by(tcp_id=metadata['tcp_id']).first()
+    if work is None:
+        work = Work(**metadata)
+        db.session.add(work)
+    elif metadata['publication_year'] and work.publication_year != metadata['publication_year']:
+        logger.info(f"Updated work {work.id}: {work.title} - Year changed from "
+                    f"{work.publication_year} to {metadata['publication_year']}")
+        work.publication_year = metadata['publication_year']
+
+    # Flush so new works have an id for the search index
+    db.session.flush()
+    return work
+
+
+def parse_files(executor, xml_files, max_in_flight):
+    """
+    Parse files on a thread pool, yielding (xml_file, future) as each finishes.
+
+    At most ``max_in_flight`` files are submitted at a time and each future
+    is dropped once yielded, so parsed documents are released as soon as
+    they are stored rather than held until the whole directory is done.
+    """
+    in_flight = {}
+    for xml_file in xml_files:
+        if len(in_flight) >= max_in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future
+
+        in_flight[executor.submit(parse_file, xml_file)] = xml_file
+
+    for future in list(concurrent.futures.as_completed(in_flight)):
+        yield in_flight.pop(future), future
+
+
+def ingest_directory(directory, index_content=True):
+    """
+    Ingest all EEBO-TCP files in a directory, parsing each file exactly once.
+
+    Each parse yields the Work row, the authoritative publication year, the
+    section index and the body text. Each file's rows are written in a
+    savepoint of their own, and works are committed in batches of 100;
+    only then is their text sent to the search index with one bulk call
+    per batch, and saved to the extracted-text store when TEXT_STORE_PATH
+    is configured.
+    """
+    logger.info(f"Starting single-pass ingest of directory: {directory}")
+    stored = 0
+    indexed = 0
+    errors = 0
+
+    # Get list of all XML files that changed since the last successful ingest
+    ledger = StageLedger('ingest')
+    xml_files = []
+    unchanged = 0
+    for root, _, files in os.walk(directory):
+        for f in files:
+            if not f.endswith('.xml'):
+                continue
+            xml_file = os.path.join(root, f)
+            if ledger.needs_processing(xml_file):
+                xml_files.append(xml_file)
+            else:
+                unchanged += 1
+
+    total_files = len(xml_files)
+    logger.info(f"Found {total_files} XML files to ingest ({unchanged} unchanged since last ingest)")
+
+    store_path = current_app.config.get('TEXT_STORE_PATH')
+    text_store = TextStore(store_path) if store_path else None
+
+    # Works stored since the last commit: (xml file, work, content, fingerprint)
+    batch = []
+
+    def finish_batch():
+        """Commit the batch, then store and index the committed works and record them in the ledger."""
+        nonlocal stored, indexed, errors
+        try:
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error committing batch of {len(batch)} works: {str(e)}")
+            db.session.rollback()
+            ledger.discard()
+            stored -= len(batch)
+            errors += len(batch)
+            batch.clear()
+            return
+
+        # Only committed ids reach the text store and the search index
+        files = {}
+        docs = []
+        for xml_file, work, content, fingerprint in batch:
+            if text_store is not None and content:
+                text_store.put(work.id, content, fingerprint[2])
+            if not index_content:
+                ledger.mark_done(xml_file, work_id=work.id, fingerprint=fingerprint)
+            elif content:
+                files[work.id] = (xml_file, fingerprint)
+                docs.append((work, content))
+            else:
+                logger.error(f"No content indexed for {xml_file}")
+                errors += 1
+        batch.clear()
+
+        def indexed_work(work_id, error):
+            nonlocal indexed, errors
+            if error is None:
+                xml_file, fingerprint = files[work_id]
+                ledger.mark_done(xml_file, work_id=work_id, fingerprint=fingerprint)
+                indexed += 1
+            else:
+                errors += 1
+
+        if docs:
+            search.bulk_index(docs, on_result=indexed_work)
+        if text_store is not None:
+            text_store.flush()
+
+        try:
+            ledger.flush()
+            db.session.commit()
+            ledger.committed()
+        except Exception as e:
+            logger.error(f"Error committing ingest ledger: {str(e)}")
+            db.session.rollback()
+            ledger.discard()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+        for xml_file, future in parse_files(executor, xml_files, PARSE_WORKERS * 4):
+            try:
+                parsed, fingerprint, sections = future.result()
+                if not parsed:
+                    errors += 1
+                    continue
+                if ledger.unchanged(xml_file, fingerprint):
+                    # Touched but identical to what was last ingested
+                    continue
+
+                # A savepoint per file, so a bad file only undoes its own rows
+                with db.session.begin_nested():
+                    work = store_work(parsed['metadata'])
+                    # Offsets only hold for the file that was scanned, not a stale archived copy
+                    if sources.checksum(work.id, xml_file) in (None, fingerprint[2]):
+                        save_sections(work.id, sources.version(work.id, xml_file), sections)
+            except Exception as e:
+                logger.error(f"Error ingesting {xml_file}: {str(e)}")
+                errors += 1
+                continue
+
+            stored += 1
+            batch.append((xml_file, work, parsed['content'], fingerprint))
+            if len(batch) >= 100:
+                finish_batch()
+                logger.info(f"Ingested {stored}/{total_files} files ({(stored / total_files) * 100:.1f}%)")
+
+    finish_batch()
+    if text_store is not None:
+        text_store.close()
+
+    logger.info(f"Ingest complete. Stored {stored} works, indexed {indexed}, with {errors} errors.")
+    return stored, indexed, errors
+
+
+if __name__ == "__main__":
+    from app import app
+
+    if not os.path.exists(EEBO_DIR):
+        logger.error(f"Directory not found: {EEBO_DIR}")
+        exit(1)
+
+    logger.info("Starting EEBO-TCP single-pass ingest")
+    with app.app_context():
+        ingest_directory(EEBO_DIR)
+    logger.info("Ingest process completed")
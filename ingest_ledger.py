@@ -0,0 +1,142 @@
+import os
+import hashlib
+from datetime import datetime
+from sqlalchemy import and_, bindparam
+from models import db
+from models.ingest import IngestLedgerEntry
+
+
+def file_fingerprint(path):
+    """Return (size, mtime, sha1) for a file."""
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return stat.st_size, stat.st_mtime, digest.hexdigest()
+
+
+def read_with_fingerprint(path):
+    """Return (data, (size, mtime, sha1)) for a file, reading it only once."""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, (stat.st_size, stat.st_mtime, hashlib.sha1(data).hexdigest())
+
+
+def forget_works(stage, work_ids):
+    """
+    Delete a stage's ledger entries for works, in the current session.
+
+    For stages whose output depends on more than the file, such as the
+    search index on a work's metadata: the next run redoes those works.
+    """
+    work_ids = list(work_ids)
+    if work_ids:
+        db.session.execute(IngestLedgerEntry.__table__.delete().where(and_(
+            IngestLedgerEntry.__table__.c.stage == stage,
+            IngestLedgerEntry.__table__.c.work_id.in_(work_ids))))
+
+
+class StageLedger:
+    """
+    Tracks which corpus files an ingest stage has already processed.
+
+    All entries for the stage are loaded with one query. A file is skipped
+    when its size and mtime match the ledger, which costs one stat and
+    never reads it. Any other file is handed to the stage, whose workers
+    fingerprint it from the bytes they read anyway; unchanged() then tells
+    a touched-but-identical file apart so its results need not be redone.
+    Entries are kept as plain tuples and written with bulk statements by
+    flush(), which stages call right before committing their own batches.
+    Stages then call committed() once the commit succeeds, or discard()
+    after a rollback, so a file is never recorded as done unless the rows
+    it produced were committed.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.state = {
+            path: (size, mtime, content_hash, work_id)
+            for path, size, mtime, content_hash, work_id in db.session.query(
+                IngestLedgerEntry.path, IngestLedgerEntry.size, IngestLedgerEntry.mtime,
+                IngestLedgerEntry.content_hash, IngestLedgerEntry.work_id
+            ).filter_by(stage=stage)
+        }
+        self._pending = {}
+        # Written to the session but not yet committed
+        self._flushed = {}
+
+    def needs_processing(self, path):
+        """Return True if the file is new or has changed since this stage last succeeded."""
+        entry = self.state.get(path)
+        if entry is None:
+            return True
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+
+        return entry[0] != stat.st_size or entry[1] != stat.st_mtime
+
+    def unchanged(self, path, fingerprint):
+        """
+        Return True if a worker's fingerprint shows the file is what this stage last processed.
+
+        The file's new size and mtime are recorded, so the next run skips it on its stat alone.
+        """
+        entry = self.state.get(path)
+        if entry is None or not fingerprint or fingerprint[2] != entry[2]:
+            return False
+        self._pending[path] = tuple(fingerprint) + (entry[3],)
+        return True
+
+    def mark_done(self, path, work_id=None, fingerprint=None):
+        """Record that the stage succeeded for a file."""
+        fingerprint = fingerprint or file_fingerprint(path)
+        if work_id is None and path in self.state:
+            work_id = self.state[path][3]
+        self._pending[path] = tuple(fingerprint) + (work_id,)
+
+    def flush(self):
+        """Write pending entries to the current db session."""
+        if not self._pending:
+            return
+
+        table = IngestLedgerEntry.__table__
+        now = datetime.utcnow()
+        inserts = []
+        updates = []
+        for path, (size, mtime, content_hash, work_id) in self._pending.items():
+            row = {'size': size, 'mtime': mtime, 'content_hash': content_hash,
+                   'work_id': work_id, 'processed_at': now}
+            if path in self.state or path in self._flushed:
+                updates.append(dict(row, b_stage=self.stage, b_path=path))
+            else:
+                inserts.append(dict(row, stage=self.stage, path=path))
+
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        if updates:
+            db.session.execute(
+                table.update()
+                .where(and_(table.c.stage == bindparam('b_stage'), table.c.path == bindparam('b_path')))
+                .values(size=bindparam('size'), mtime=bindparam('mtime'),
+                        content_hash=bindparam('content_hash'), work_id=bindparam('work_id'),
+                        processed_at=bindparam('processed_at')),
+                updates
+            )
+
+        self._flushed.update(self._pending)
+        self._pending = {}
+
+    def committed(self):
+        """Take flushed entries as the ledger's state once the session has been committed."""
+        self.state.update(self._flushed)
+        self._flushed = {}
+
+    def discard(self):
+        """Forget pending and flushed entries after the session has been rolled back."""
+        self._pending = {}
+        self._flushed = {}
@@ -0,0 +1,224 @@
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict
+from models import db
+from models.work import Work
+from processors.eebo import extract_source_text
+from normalization import TokenNormalizer
+from storage import TextStore, resolver_for
+import logging
+from datetime import datetime
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(f'mine_variants_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Runs of letters; numbers and punctuation never take part in spelling variation
+WORD = re.compile(r'[^\W\d_]+')
+
+# Normalized forms contain no j or v, and doubling a vowel makes another word (too, to)
+VOWELS = set('aeiouy')
+CONSONANTS = set('bcdfghklmnpqrstwxz')
+
+# Lucene's English stop set (Elasticsearch's _english_) and the early modern stopwords
+# of the search index. Function words are too frequent and too short for a letter more
+# or less to be a spelling rather than another word (to, toe; but, butt; the, th)
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in', 'into', 'is', 'it',
+    'no', 'not', 'of', 'on', 'or', 'such', 'that', 'the', 'their', 'then', 'there', 'these',
+    'they', 'this', 'to', 'was', 'will', 'with',
+    'thee', 'thou', 'ye', 'hath', 'doth', 'thy', 'thine',
+])
+
+# Shortest usual spelling a variant is mined for; shorter words are mostly function words
+MIN_LENGTH = 3
+
+
+def iter_texts(app, batch_size=1000):
+    """Yield the text of every work, from the text store when it has it, otherwise from the source."""
+    store_path = app.config.get('TEXT_STORE_PATH')
+    store = TextStore(store_path) if store_path and os.path.exists(f'{store_path}.idx') else None
+    resolver = resolver_for(app.config.get('CORPUS_ARCHIVE_PATH'))
+    last_id = 0
+    try:
+        while True:
+            rows = db.session.query(Work.id, Work.file_path).filter(Work.id > last_id) \
+                .order_by(Work.id).limit(batch_size).all()
+            if not rows:
+                return
+            for work_id, file_path in rows:
+                text = None
+                try:
+                    if store is not None:
+                        text = store.get(work_id)
+                    if text is None:
+                        with resolver.open(work_id, file_path) as source:
+                            text = extract_source_text(source)
+                except Exception as e:
+                    logger.error(f"Error reading work {work_id}: {str(e)}")
+                if text:
+                    yield text
+            last_id = rows[-1][0]
+    finally:
+        if store is not None:
+            store.close()
+
+
+def count_spellings(texts):
+    """Count every lowercased spelling in the texts."""
+    counts = Counter()
+    for i, text in enumerate(texts, 1):
+        counts.update(WORD.findall(text.lower()))
+        if i % 1000 == 0:
+            logger.info(f"Counted {i} works, {len(counts)} distinct spellings")
+    return counts
+
+
+def shorter_spellings(form):
+    """
+    Yield the forms ``form`` would be without a final e or a doubled final consonant.
+
+    An e after a single vowel and consonant changes the word rather than
+    its spelling (made, mad), so those are left alone.
+    """
+    if form.endswith('e') and len(form) > 2:
+        base = form[:-1]
+        if not (base[-1] in CONSONANTS and base[-2] in VOWELS and base[-3:-2] not in VOWELS):
+            yield base
+        if len(base) > 3 and base[-1] == base[-2] and base[-1] in CONSONANTS:
+            yield base[:-1]
+    if len(form) > 3 and form[-1] == form[-2] and form[-1] in CONSONANTS:
+        yield form[:-1]
+
+
+def variant_clusters(counts, normalizer, min_count=5, max_variants=20, max_ratio=0.5):
+    """
+    Group normalized forms that the normalization rules leave apart.
+
+    Every spelling is normalized first, so the variants the rules already
+    unify (loue, love) are a single form in content_normalized and are not
+    repeated here. Two forms are then taken as spellings of one word when
+    they differ by a final e or a doubled final consonant (worde, word; shal,
+    shall; sinne, sin), the commonest early modern habits no rule covers,
+    and the rarer is at most ``max_ratio`` times as frequent, so the usual
+    spelling heads its cluster. Pairs involving a stopword or a form
+    shorter than MIN_LENGTH are skipped, forms seen fewer than
+    ``min_count`` times are left out as OCR and transcription noise, and
+    clusters of more than ``max_variants`` variants as accidents.
+    """
+    forms = Counter()
+    for spelling, count in counts.items():
+        forms[normalizer.normalize_token(spelling)] += count
+    forms = {form: count for form, count in forms.items() if count >= min_count}
+
+    # Each form points at the most frequent form it is a rarer spelling of
+    parents = {}
+    for form, count in forms.items():
+        if form in STOPWORDS:
+            continue
+        for base in shorter_spellings(form):
+            if base not in forms or base in STOPWORDS or len(base) < MIN_LENGTH:
+                continue
+            variant, usual = (form, base) if count < forms[base] else (base, form)
+            if forms[variant] <= max_ratio * forms[usual] and \
+                    (variant not in parents or forms[usual] > forms[parents[variant]]):
+                parents[variant] = usual
+
+    clusters = defaultdict(list)
+    for form in parents:
+        # A variant of a variant (shalle, shal, shall) joins the cluster of the most usual form
+        root = parents[form]
+        while root in parents:
+            root = parents[root]
+        clusters[root].append(form)
+
+    result = []
+    for root, variants in clusters.items():
+        if len(variants) <= max_variants:
+            result.append([root] + sorted(variants, key=lambda form: (-forms[form], form)))
+    result.sort(key=lambda cluster: cluster[0])
+    return result
+
+
+def write_synonyms(path, clusters, fingerprint):
+    """
+    Write clusters as one-way Solr-format rules, ``variant => variant, usual``, atomically.
+
+    Rules are one-way: a search for a rare spelling also finds the usual
+    one, but a search for the usual spelling is left as it is.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(f"# Early modern spelling variants mined {datetime.now().isoformat(timespec='seconds')}\n")
+        f.write(f"# Normalization rules {fingerprint}\n")
+        for usual, *variants in clusters:
+            for variant in variants:
+                f.write(f"{variant} => {variant}, {usual}\n")
+    os.replace(tmp_path, path)
+
+
+def mine_variants(app, output=None, min_count=5, max_variants=20, max_ratio=0.5):
+    """
+    Mine spelling variant clusters from the corpus and write them as a synonym file.
+
+    The clusters are of normalized forms and extend normalization.py:
+    they cover variants its rules don't, and the search index applies
+    them to queries on the content_normalized field. Every distinct spelling is
+    normalized once, through a TokenNormalizer whose type map is loaded
+    from and saved to NORMALIZATION_TYPE_MAP when it is set. The search
+    index reads the file from VARIANT_SYNONYMS_PATH when it is created,
+    so an index rebuild picks up a new lexicon.
+    """
+    with app.app_context():
+        output = output or app.config.get('VARIANT_SYNONYMS_PATH')
+        if not output:
+            logger.error("No output path: pass --output or set VARIANT_SYNONYMS_PATH")
+            return
+
+        counts = count_spellings(iter_texts(app))
+        logger.info(f"{sum(counts.values())} tokens, {len(counts)} distinct spellings")
+
+        type_map = app.config.get('NORMALIZATION_TYPE_MAP')
+        normalizer = TokenNormalizer(max_types=max(len(counts), 500000), path=type_map)
+        clusters = variant_clusters(counts, normalizer, min_count=min_count, max_variants=max_variants,
+                                    max_ratio=max_ratio)
+        logger.info(f"Normalized {normalizer.misses} new spellings; "
+                    f"{len(clusters)} variant clusters covering {sum(map(len, clusters))} normalized forms")
+        if type_map:
+            try:
+                normalizer.save()
+            except OSError as e:
+                logger.warning(f"Could not save type map {type_map}: {str(e)}")
+
+        write_synonyms(output, clusters, normalizer.normalizer.fingerprint)
+        logger.info(f"Wrote {output}; rebuild the search index (index_works.py --rebuild) to use it")
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Mine spelling variants from the corpus as Elasticsearch synonyms")
+    parser.add_argument('--output', help="Synonym file to write (defaults to VARIANT_SYNONYMS_PATH)")
+    parser.add_argument('--min-count', type=int, default=5,
+                        help="Occurrences a normalized form needs to be included")
+    parser.add_argument('--max-variants', type=int, default=20,
+                        help="Most variants a cluster may have; larger ones are dropped as accidents")
+    parser.add_argument('--max-ratio', type=float, default=0.5,
+                        help="Most frequent a variant may be, relative to the usual spelling")
+    args = parser.parse_args()
+
+    logger.info("Starting variant mining")
+    mine_variants(app, output=args.output, min_count=args.min_count, max_variants=args.max_variants,
+                  max_ratio=args.max_ratio)
+    logger.info("Variant mining finished")
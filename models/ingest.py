@@ -0,0 +1,62 @@
+# models/ingest.py
+from models import db
+from datetime import datetime
+
+
+class IngestLedgerEntry(db.Model):
+    """Fingerprint of a corpus file as of the last successful run of an ingest stage."""
+    __tablename__ = 'ingest_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    stage = db.Column(db.String(50), nullable=False)  # e.g. 'metadata', 'publication_year', 'index'
+    path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    work_id = db.Column(db.Integer, db.ForeignKey('work.id'), nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('stage', 'path', name='unique_ledger_stage_path'),
+    )
+
+    def __repr__(self):
+        return f"<IngestLedgerEntry(stage={self.stage}, path={self.path})>"
+
+
+class ReindexJob(db.Model):
+    """Progress of a search reindex run, so an interrupted run can be resumed."""
+    __tablename__ = 'reindex_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, failed
+    index_name = db.Column(db.String(100), nullable=True)  # New index version for a rebuild, else the live alias
+    last_work_id = db.Column(db.Integer, nullable=False, default=0)  # All works up to this id are done
+    indexed_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    failures = db.relationship('ReindexFailure', backref='job', lazy='dynamic')
+
+    def __repr__(self):
+        return f"<ReindexJob(id={self.id}, status={self.status}, last_work_id={self.last_work_id})>"
+
+
+class ReindexFailure(db.Model):
+    """A work that failed to index in a reindex job, kept for retrying."""
+    __tablename__ = 'reindex_failure'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('reindex_job.id'), nullable=False)
+    work_id = db.Column(db.Integer, db.ForeignKey('work.id'), nullable=False)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    failed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'work_id', name='unique_reindex_failure'),
+    )
+
+    def __repr__(self):
+        return f"<ReindexFailure(job_id={self.job_id}, work_id={self.work_id}, attempts={self.attempts})>"
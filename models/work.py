@@ -31,4 +31,25 @@ class Work(db.Model):
     )
 
     def __repr__(self):
-        return f"<Work(title={self.title}, author={self.author}, tcp_id={self.tcp_id})>"
\ No newline at end of file
+        return f"<Work(title={self.title}, author={self.author}, tcp_id={self.tcp_id})>"
+
+
+class WorkSection(db.Model):
+    """Byte range of a top-level body <div> in a work's source XML, for parsing one section alone."""
+    __tablename__ = 'work_section'
+
+    id = db.Column(db.Integer, primary_key=True)
+    work_id = db.Column(db.Integer, db.ForeignKey('work.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(500), nullable=False)
+    div_type = db.Column(db.String(50))
+    start_offset = db.Column(db.BigInteger, nullable=False)
+    end_offset = db.Column(db.BigInteger, nullable=False)
+    source_version = db.Column(db.String(64), nullable=False)  # SourceResolver.version when scanned
+
+    __table_args__ = (
+        db.UniqueConstraint('work_id', 'position', name='unique_work_section_position'),
+    )
+
+    def __repr__(self):
+        return f"<WorkSection(work_id={self.work_id}, position={self.position}, title={self.title})>"
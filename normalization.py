@@ -1,58 +1,227 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
 import unicodedata
+import zlib
 
-# Updated replacement map that converts Elizabethan to modern English
-replacement_map = {
-    "Æ": "ae", "æ": "ae",
-    "ſ": "s",
-    "ꝛ": "r",
-    "j": "i",
-    "v": "u",
-    "th": "y",
-    "Þ": "th", "þ": "th",
-    "Ð": "d", "ð": "d",
-    "ƿ": "w",
-    "Ƿ": "w",
-    "ꝣ": "d",
-    "Ꝺ": "d",
-    "Ȝ": "y", "ȝ": "y",
-    "ß": "ss",
-    "Œ": "oe", "œ": "oe",
-    "Ꝋ": "o", "ꝋ": "o",
-    "Ꝑ": "p", "ꝑ": "p",
-    "Ꝙ": "q", "ꝙ": "q",
-    "ꝺ": "d"
-}
+# Substitutions that convert Elizabethan spelling to modern English, in the
+# order they apply: single characters (applied to either case), archaic
+# forms and common spelling variations. No rule's output can form another
+# rule's input, so the order never changes the result.
+RULES = [
+    ('j', 'i'),
+    ('v', 'u'),
+    ('ye', 'the'),
+    ('æ', 'ae'),
+    ('tragedie', 'tragedy'),
+    ('comedie', 'comedy'),
+    ('historie', 'history'),
+    ('ſ', 's'),  # long s
+    ('haviour', 'havior'),
+    ('honour', 'honor'),
+    ('labour', 'labor'),
+    ('griefe', 'grief'),
+    ('loue', 'love'),
+    ('publike', 'public'),
+    ('musicke', 'music'),
+    ('magicke', 'magic'),
+    ('worke', 'work'),
+    ('booke', 'book'),
+]
 
+# Joins texts in normalize_many; no rule matches across it
+SEPARATOR = '\x00'
 
-def normalize_text(text):
-    if not text:
+# Splits text into tokens and the whitespace between them, keeping both
+TOKEN_SPLIT = re.compile(r'(\s+)')
+
+logger = logging.getLogger(__name__)
+
+
+class Normalizer:
+    """
+    Normalization of early modern spelling to modern forms, compiled from a rule table.
+
+    Text is decomposed with NFKD and lowercased. ASCII text, the common
+    case, gets its character rules from one str.translate call, which
+    CPython runs on a fast path. Other text is scanned once for its
+    distinct characters, and only the combining marks and rule characters
+    that occur are replaced. Spelling rules are likewise only applied
+    when they occur, so a string is copied once per rule that matches
+    rather than once per rule.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(RULES if rules is None else rules)
+
+        character_map = {}
+        for source, target in self.rules:
+            if len(source) == 1:
+                character_map[source] = target
+                # Map the capital too, since characters are replaced before lowercasing
+                upper = source.upper()
+                if len(upper) == 1 and upper.lower() == source:
+                    character_map[upper] = target
+        self._character_map = character_map
+        self._ascii_table = str.maketrans({source: target for source, target in character_map.items()
+                                           if source.isascii() and len(target) == 1})
+        self._spelling_rules = [(source, target) for source, target in self.rules if len(source) > 1]
+
+        # Identifies results produced under these rules
+        self.fingerprint = hashlib.sha1(repr(self.rules).encode('utf-8')).hexdigest()
+
+    def normalize(self, text):
+        """Lowercase, remove diacritics and modernize the spelling of a string."""
+        if not text:
+            return text
+
+        text = unicodedata.normalize('NFKD', text)
+        if text.isascii():
+            # No combining marks, and only the ASCII character rules can apply
+            text = text.lower().translate(self._ascii_table)
+        else:
+            for char in set(text):
+                if unicodedata.combining(char):
+                    text = text.replace(char, '')
+                elif char in self._character_map:
+                    text = text.replace(char, self._character_map[char])
+            text = text.lower()
+
+        for source, target in self._spelling_rules:
+            if source in text:
+                text = text.replace(source, target)
         return text
 
-    # Convert to lowercase and remove diacritics
-    text = unicodedata.normalize('NFKD', text)
-    text = ''.join(c for c in text if not unicodedata.combining(c))
-    text = text.lower()
-
-    # Character substitutions
-    text = text.replace('j', 'i')
-    text = text.replace('v', 'u')
-    text = text.replace('ye', 'the')
-    text = text.replace('æ', 'ae')
-
-    # Common spelling variations
-    text = text.replace('tragedie', 'tragedy')
-    text = text.replace('comedie', 'comedy')
-    text = text.replace('historie', 'history')
-    text = text.replace('ſ', 's')  # long s
-    text = text.replace('haviour', 'havior')
-    text = text.replace('honour', 'honor')
-    text = text.replace('labour', 'labor')
-    text = text.replace('griefe', 'grief')
-    text = text.replace('loue', 'love')
-    text = text.replace('publike', 'public')
-    text = text.replace('musicke', 'music')
-    text = text.replace('magicke', 'magic')
-    text = text.replace('worke', 'work')
-    text = text.replace('booke', 'book')
-
-    return text
\ No newline at end of file
+    def normalize_many(self, texts):
+        """
+        Normalize an iterable of strings, returning a list in the same order.
+
+        The strings are joined and normalized in a single pass, which saves
+        the per-call overhead when there are many short ones.
+        """
+        texts = list(texts)
+        joinable = [text for text in texts if text]
+        if any(SEPARATOR in text for text in joinable):
+            return [self.normalize(text) for text in texts]
+
+        normalized = iter(self.normalize(SEPARATOR.join(joinable)).split(SEPARATOR))
+        return [next(normalized) if text else text for text in texts]
+
+
+class TokenNormalizer:
+    """
+    Normalization memoized per token, for normalizing large amounts of text.
+
+    Text is split on whitespace, which no rule matches or produces, so
+    normalizing each token gives the same result as normalizing the whole
+    text. Spellings follow Zipf's law, so after a few documents almost
+    every token is found in the type map and the rules run about once
+    per distinct spelling. The map is bounded by ``max_types`` and evicts
+    the least recently used type. Nothing is evicted before it is full, so
+    recency is only tracked from then on, keeping the common all-hits path
+    to one dict lookup per token. The map can be saved to and loaded from a
+    file, in recency order, so later runs and worker processes start warm.
+    A saved map is only used by a normalizer with the same rule fingerprint.
+    """
+
+    def __init__(self, base=None, max_types=500000, path=None):
+        self.normalizer = base or normalizer
+        self.max_types = max(1, max_types)
+        self.path = path
+        self.types = {}
+        self.misses = 0
+        if path:
+            self.load(path)
+
+    def normalize_token(self, token):
+        """Return the normalized form of one token, applying the rules on a miss."""
+        types = self.types
+        if len(types) < self.max_types:
+            normalized = types.get(token)
+            if normalized is None:
+                normalized = types[token] = self.normalizer.normalize(token)
+                self.misses += 1
+            return normalized
+
+        # Full: reinsert on every use, so the first type is the least recently used
+        normalized = types.pop(token, None)
+        if normalized is None:
+            normalized = self.normalizer.normalize(token)
+            self.misses += 1
+            del types[next(iter(types))]
+        types[token] = normalized
+        return normalized
+
+    def normalize(self, text):
+        """Normalize a string; the result equals Normalizer.normalize(text)."""
+        if not text:
+            return text
+        pieces = TOKEN_SPLIT.split(text)
+        types = self.types
+        if len(types) < self.max_types:
+            try:
+                # Fast path: every token has been seen before
+                return ''.join([types[piece] for piece in pieces])
+            except KeyError:
+                pass
+        return ''.join([self.normalize_token(piece) for piece in pieces])
+
+    def normalize_many(self, texts):
+        return [self.normalize(text) for text in texts]
+
+    def load(self, path=None):
+        """
+        Add the types saved in a file, if it exists and was built with the same rules.
+
+        Saved types count as less recently used than those already in the
+        map, and when they don't all fit, the most recently used are kept.
+        """
+        path = path or self.path
+        try:
+            with open(path, 'rb') as f:
+                payload = json.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Ignoring unreadable type map {path}: {str(e)}")
+            return 0
+
+        if payload.get('fingerprint') != self.normalizer.fingerprint:
+            logger.info(f"Ignoring type map {path} built with different normalization rules")
+            return 0
+        types = {token: normalized for token, normalized in payload['types'].items()
+                 if token not in self.types}
+        loaded = len(types)
+        types.update(self.types)
+        for token in list(itertools.islice(types, max(0, len(types) - self.max_types))):
+            del types[token]
+        self.types = types
+        return min(loaded, self.max_types)
+
+    def save(self, path=None):
+        """Write the type map atomically, so concurrent readers never see a partial file."""
+        path = path or self.path
+        raw = json.dumps({'fingerprint': self.normalizer.fingerprint, 'types': self.types},
+                         ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(zlib.compress(raw, 6))
+        os.replace(tmp_path, path)
+        return len(self.types)
+
+
+normalizer = Normalizer()
+
+
+def normalize_text(text):
+    return normalizer.normalize(text)
+
+
+def normalize_many(texts):
+    return normalizer.normalize_many(texts)
@@ -0,0 +1,89 @@
+import os
+import hashlib
+from models import db
+from models.work import Work
+from storage import PackWriter
+from ingest_ledger import StageLedger
+import logging
+from datetime import datetime
+
+# Set up logging
+log_filename = f"corpus_pack_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_filename),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def pack_corpus(app, archive_path=None, compress=True, batch_size=1000):
+    """
+    Pack the source XML of every work into the corpus archive, keyed by Work.id.
+
+    Files the ledger has already packed in their current state are skipped,
+    so repacking after a new release only appends new or changed works.
+    """
+    with app.app_context():
+        archive_path = archive_path or app.config.get('CORPUS_ARCHIVE_PATH')
+        if not archive_path:
+            logger.error("No archive path given and CORPUS_ARCHIVE_PATH is not set")
+            return
+
+        ledger = StageLedger('archive')
+        packed = 0
+        unchanged = 0
+        missing = 0
+        last_id = 0
+
+        with PackWriter(archive_path, compress=compress) as writer:
+            while True:
+                rows = db.session.query(Work.id, Work.file_path) \
+                    .filter(Work.id > last_id).order_by(Work.id).limit(batch_size).all()
+                if not rows:
+                    break
+
+                for work_id, file_path in rows:
+                    if not os.path.exists(file_path):
+                        logger.error(f"File not found: {file_path}")
+                        missing += 1
+                        continue
+                    if not ledger.needs_processing(file_path):
+                        unchanged += 1
+                        continue
+
+                    stat = os.stat(file_path)
+                    with open(file_path, 'rb') as f:
+                        data = f.read()
+                    fingerprint = (stat.st_size, stat.st_mtime, hashlib.sha1(data).hexdigest())
+                    writer.put(work_id, data, fingerprint[2], mtime_ns=stat.st_mtime_ns)
+                    ledger.mark_done(file_path, work_id=work_id, fingerprint=fingerprint)
+                    packed += 1
+
+                # The archive must be on disk before the ledger says so
+                writer.flush()
+                ledger.flush()
+                db.session.commit()
+                ledger.committed()
+                last_id = rows[-1][0]
+                logger.info(f"Packed {packed} works so far ({unchanged} unchanged, {missing} missing)")
+
+        logger.info(f"Packing complete. {packed} works packed into {archive_path}, "
+                    f"{unchanged} unchanged, {missing} missing")
+
+
+if __name__ == "__main__":
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Pack the corpus XML into a random-access archive")
+    parser.add_argument('--archive', default=None,
+                        help="Archive path (defaults to CORPUS_ARCHIVE_PATH)")
+    parser.add_argument('--no-compress', action='store_true',
+                        help="Store XML uncompressed")
+    args = parser.parse_args()
+
+    pack_corpus(app, archive_path=args.archive, compress=not args.no_compress)
@@ -0,0 +1,356 @@
+# processors/eebo.py
+
+import os
+import re
+import itertools
+from xml.etree import ElementTree as ET
+from xml.parsers import expat
+from processors import tei_transformer, xml_backend
+from processors.xml_backend import Path
+
+TEI_NS = '{http://www.tei-c.org/ns/1.0}'
+
+# Paths are compiled once at import, as XPath objects under lxml
+HEADER = Path('.//tei:teiHeader')
+TITLE = Path('.//tei:title')
+AUTHOR = Path('.//tei:author')
+DATE = Path('.//tei:date')
+SOURCE_DATE = Path('.//tei:sourceDesc//tei:biblFull//tei:publicationStmt//tei:date')
+EDITION_DATE = Path('.//tei:editionStmt//tei:edition//tei:date')
+SPEECHES = Path('.//speech')
+SPEAKER = Path('speaker')
+LINES = Path('line')
+STAGE_DIRECTIONS = Path('.//stagedir')
+
+
+def find_header(root):
+    """Return the teiHeader element of a parsed EEBO-TCP document."""
+    if root.tag == f'{TEI_NS}teiHeader':
+        return root
+    return HEADER.find(root)
+
+
+def read_header(source):
+    """
+    Stream an EEBO-TCP file only as far as the end of its teiHeader.
+
+    ``source`` is a path or a binary file object. The body is never read or
+    built: parsing stops as soon as the header closes (or the <text>
+    element opens), and any top-level siblings seen before the header are
+    cleared as they complete.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return read_header(f)
+
+    root = None
+    depth = 0
+    for event, elem in xml_backend.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if root is None:
+                root = elem
+                if not root.tag.startswith(TEI_NS):
+                    return None
+            elif depth == 2 and elem.tag == f'{TEI_NS}text':
+                return None
+            continue
+
+        depth -= 1
+        if elem.tag == f'{TEI_NS}teiHeader':
+            return elem
+        if depth == 1:
+            # A top-level element outside the header: free it
+            elem.clear()
+            root.remove(elem)
+    return None
+
+
+def extract_metadata(header, xml_path):
+    """Build the Work fields for an EEBO-TCP file from its teiHeader."""
+    # Extract basic metadata
+    title_elem = TITLE.find(header)
+    title = ' '.join(title_elem.itertext()).strip() if title_elem is not None else "Unknown Title"
+
+    author_elem = AUTHOR.find(header)
+    author = ' '.join(author_elem.itertext()).strip() if author_elem is not None else None
+
+    # Extract TCP ID from filename
+    tcp_id = os.path.splitext(os.path.basename(xml_path))[0]
+
+    # Find publication date
+    date_elem = DATE.find(header)
+    try:
+        pub_year = int(date_elem.get('when')) if date_elem is not None else None
+    except (ValueError, TypeError):
+        pub_year = None
+
+    return {
+        'title': title[:500],  # Truncate to match model field length
+        'author': author[:200] if author else None,
+        'publication_year': pub_year,
+        'tcp_id': tcp_id,
+        'file_path': xml_path,
+        'format': 'xml',
+        'collection': 'EEBO-TCP',
+        'language': 'eng'  # Default to English, could be extracted from metadata
+    }
+
+
+def extract_publication_year(header):
+    """Extract publication year from multiple possible locations in EEBO-TCP XML."""
+    # Try sourceDesc/biblFull/publicationStmt/date first (most authoritative)
+    date_elem = SOURCE_DATE.find(header)
+
+    # If not found, try editionStmt/edition/date
+    if date_elem is None:
+        date_elem = EDITION_DATE.find(header)
+
+    if date_elem is not None:
+        # Try 'when' attribute first
+        year = date_elem.get('when')
+        if not year:
+            # If no 'when' attribute, try text content
+            year = date_elem.text
+
+        # Clean up the year string
+        if year:
+            # Remove any punctuation
+            year = year.strip('.')
+            # Extract just the year if it's a longer date
+            year_match = re.search(r'\b(\d{4})\b', year)
+            if year_match:
+                return int(year_match.group(1))
+
+            # If it's just a year number
+            if year.isdigit() and len(year) == 4:
+                return int(year)
+
+    return None
+
+
+def extract_body_text(root):
+    """Extract the indexable full text from a parsed XML document."""
+    # Handle different XML formats
+    if 'tei-c.org' in str(root.tag):  # EEBO-TCP format
+        # Same text as rendered, without gap markers
+        return tei_transformer.text(tei_transformer.transform(tei_transformer.tree_events(root), gap_marks=False))
+    else:  # Shakespeare play format
+        text_parts = []
+
+        # Extract speeches
+        for speech in SPEECHES.findall(root):
+            speaker = SPEAKER.find(speech)
+            if speaker is not None:
+                text_parts.append(speaker.text)
+
+            for line in LINES.findall(speech):
+                text_parts.append(xml_backend.text_content(line))
+
+        # Extract stage directions
+        for stagedir in STAGE_DIRECTIONS.findall(root):
+            text_parts.append(stagedir.text)
+
+        return " ".join(part for part in text_parts if part)
+
+
+class _SectionScanner:
+    """
+    Expat handlers that record the byte range and title of each top-level body <div>.
+
+    Titles come from the transformer, so notes and gaps in a head are
+    treated as on the page. ``sections`` holds (start, end, title, div_type).
+    """
+
+    def __init__(self, parser, data):
+        self.parser = parser
+        self.data = data
+        self.sections = []
+        self.stack = []
+        self.current = None
+        self.head_depth = None
+        self.head_events = []
+        self.just_started = False
+
+    def start(self, tag, attrs):
+        self.just_started = True
+        stack = self.stack
+        if self.current is None and tag == f'{TEI_NS}div' and stack and stack[-1] == f'{TEI_NS}body':
+            self.current = [self.parser.CurrentByteIndex, len(stack), attrs.get('type') or '', None]
+        elif self.current is not None and self.head_depth is None and self.current[3] is None \
+                and tag == f'{TEI_NS}head' and len(stack) == self.current[1] + 1:
+            self.head_depth = len(stack)
+        if self.head_depth is not None:
+            self.head_events.append(('start', tag, attrs))
+        stack.append(tag)
+
+    def end(self, tag):
+        empty = self.just_started
+        self.just_started = False
+        self.stack.pop()
+        if self.head_depth is not None:
+            self.head_events.append(('end', tag, None))
+            if len(self.stack) == self.head_depth:
+                self.current[3] = tei_transformer.text(tei_transformer.transform(self.head_events, body_only=False))
+                self.head_events = []
+                self.head_depth = None
+        elif self.current is not None and len(self.stack) == self.current[1]:
+            start_offset, _, div_type, title = self.current
+            end_offset = self.parser.CurrentByteIndex
+            # Expat reports the end of <div/> just past it, and of </div> at its '<'
+            if not (empty and self.data[end_offset - 2:end_offset] == b'/>'):
+                end_offset = self.data.index(b'>', end_offset) + 1
+            self.sections.append((start_offset, end_offset,
+                                  tei_transformer.section_title(title, div_type, len(self.sections)), div_type))
+            self.current = None
+
+    def characters(self, text):
+        self.just_started = False
+        if self.head_depth is not None:
+            self.head_events.append(('text', text, None))
+
+
+def _expat_parser():
+    parser = expat.ParserCreate(namespace_separator='}')
+    parser.buffer_text = True
+    return parser
+
+
+def _tag(name):
+    return '{' + name if '}' in name else name
+
+
+def scan_sections(data):
+    """
+    Find the byte range of each top-level <div> in the body of a TEI document.
+
+    ``data`` is the raw XML as bytes. Returns a list of (start, end, title,
+    div_type), where ``data[start:end]`` is the complete <div> element.
+    These are the sections tei_transformer.sections divides whole documents
+    into, titled by the same rules. Only expat runs, so no tree is built.
+    """
+    parser = _expat_parser()
+    scanner = _SectionScanner(parser, data)
+    parser.StartElementHandler = lambda name, attrs: scanner.start(_tag(name), attrs)
+    parser.EndElementHandler = lambda name: scanner.end(_tag(name))
+    parser.CharacterDataHandler = scanner.characters
+    try:
+        parser.Parse(data, True)
+    except expat.ExpatError as e:
+        raise ET.ParseError(str(e)) from e
+    return scanner.sections
+
+
+def scan_eebo_data(xml_path, data, chunk_size=256 * 1024):
+    """
+    Extract everything the ingest needs from an EEBO-TCP file's bytes in a single expat pass.
+
+    Returns (parsed, sections): ``parsed`` is what parse_eebo_file returns
+    and ``sections`` what scan_sections does. Only the teiHeader is built
+    as a tree, for the metadata paths; the body text comes from the
+    transformer's event stream and the section offsets from the same
+    events, so the document is parsed once.
+    """
+    parser = _expat_parser()
+    scanner = _SectionScanner(parser, data)
+    header_builder = None
+    header = None
+    pending = []
+
+    def start(name, attrs):
+        nonlocal header_builder
+        tag = _tag(name)
+        scanner.start(tag, attrs)
+        if header_builder is None and header is None and tag == f'{TEI_NS}teiHeader':
+            header_builder = ET.TreeBuilder()
+        if header_builder is not None:
+            header_builder.start(tag, attrs)
+        pending.append(('start', tag, attrs))
+
+    def end(name):
+        nonlocal header_builder, header
+        tag = _tag(name)
+        scanner.end(tag)
+        if header_builder is not None:
+            header_builder.end(tag)
+            if tag == f'{TEI_NS}teiHeader':
+                header = header_builder.close()
+                header_builder = None
+        pending.append(('end', tag, None))
+
+    def characters(text):
+        scanner.characters(text)
+        if header_builder is not None:
+            header_builder.data(text)
+        pending.append(('text', text, None))
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+
+    def events():
+        # Fed in chunks, so only a chunk's worth of events is held at a time
+        for offset in range(0, len(data), chunk_size):
+            try:
+                parser.Parse(data[offset:offset + chunk_size], offset + chunk_size >= len(data))
+            except expat.ExpatError as e:
+                raise ET.ParseError(str(e)) from e
+            yield from pending
+            pending.clear()
+
+    content = tei_transformer.text(tei_transformer.transform(events(), gap_marks=False))
+    if header is None:
+        return None, scanner.sections
+
+    metadata = extract_metadata(header, xml_path)
+    pub_year = extract_publication_year(header)
+    if pub_year:
+        metadata['publication_year'] = pub_year
+    return {'metadata': metadata, 'content': content}, scanner.sections
+
+
+def extract_source_text(source):
+    """
+    Extract the indexable full text from an XML path or binary file object.
+
+    TEI documents are streamed through the transformer without building a
+    tree; anything else is parsed and handled by extract_body_text.
+    """
+    events = tei_transformer.iter_events(source)
+    first = next(events, None)
+    if first is None:
+        return ""
+    if 'tei-c.org' in first[1]:
+        events = itertools.chain([first], events)
+        return tei_transformer.text(tei_transformer.transform(events, gap_marks=False))
+
+    events.close()
+    if not isinstance(source, str):
+        source.seek(0)
+    return extract_body_text(xml_backend.parse(source))
+
+
+def parse_eebo_file(xml_path, data=None):
+    """
+    Parse an EEBO-TCP file once and extract everything the ingest needs.
+
+    Returns a dict with the Work ``metadata`` (its ``publication_year`` already
+    set to the authoritative sourceDesc/biblFull year when one exists) and the
+    body ``content`` for the search index, or None if the file has no header.
+    Pass the file's bytes as ``data`` when they have already been read.
+    """
+    root = xml_backend.fromstring(data) if data is not None else xml_backend.parse(xml_path)
+
+    header = find_header(root)
+    if header is None:
+        return None
+
+    metadata = extract_metadata(header, xml_path)
+    pub_year = extract_publication_year(header)
+    if pub_year:
+        metadata['publication_year'] = pub_year
+
+    return {
+        'metadata': metadata,
+        'content': extract_body_text(root)
+    }
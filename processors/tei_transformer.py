@@ -0,0 +1,325 @@
+# processors/tei_transformer.py
+"""
+Single-pass, event-driven transformation of TEI text into display items.
+
+Both rendering and indexing run on the same engine. A document is read as
+a flat stream of ('start', tag, attrib), ('text', text, None) and
+('end', tag, None) events, either straight from expat (``iter_events``,
+no tree is built) or from an already-parsed element (``tree_events``).
+``transform`` turns the stream into:
+
+    ('section_start', div_type, None) a <div> directly inside <body>
+    ('section_title', 'head', text)   its first child <head>
+    ('chapter_start', None, None)
+    ('chapter_title', 'head', text)   first <head> of a chapter div
+    ('item', kind, text)              kind is 'head', 'line' or 'p'
+    ('chapter_end', None, None)
+    ('section_end', None, None)
+
+Sections are the units works are displayed and indexed by: the section
+index (processors.eebo.scan_sections) records the byte range of the same
+divs, so both give the same table of contents.
+
+Each event is handled once, with state held only for the open elements,
+so the whole pass is O(document).
+"""
+from xml.etree import ElementTree as ET
+from xml.parsers import expat
+
+TEI_NS = '{http://www.tei-c.org/ns/1.0}'
+
+# Elements whose text forms one display item, and the kind of item
+BLOCKS = {
+    'p': 'p',
+    'l': 'line',
+    'head': 'head',
+    'item': 'p',
+    'trailer': 'p',
+    'byline': 'p',
+    'dateline': 'p',
+    'salute': 'p',
+    'signed': 'p',
+    'argument': 'p',
+}
+
+# Elements whose own text is left out of the surrounding item
+SKIPPED = {'note', 'figDesc'}
+
+# Elements that start a new item: loose text before them is emitted first
+DIVISIONS = {'div', 'lg', 'sp', 'list', 'table', 'figure', 'body', 'front', 'back'}
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def section_title(title, div_type, position):
+    """Title shown for a section: its head, else its div type, else its position."""
+    return title or div_type.replace('_', ' ').capitalize() or f'Section {position + 1}'
+
+
+def iter_events(source, chunk_size=256 * 1024):
+    """
+    Yield parse events for a path, bytes or binary file object using expat.
+
+    The source is fed in chunks and events are handed out after each one,
+    so memory use is bounded by the chunk size, not the document.
+    Malformed XML raises ElementTree.ParseError, as ElementTree would.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from iter_events(f, chunk_size)
+        return
+
+    parser = expat.ParserCreate(namespace_separator='}')
+    parser.buffer_text = True
+    pending = []
+
+    def start(name, attrs):
+        pending.append(('start', '{' + name if '}' in name else name, attrs))
+
+    def end(name):
+        pending.append(('end', '{' + name if '}' in name else name, None))
+
+    def characters(text):
+        pending.append(('text', text, None))
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+
+    def feed(data, final):
+        try:
+            parser.Parse(data, final)
+        except expat.ExpatError as e:
+            raise ET.ParseError(str(e)) from e
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        feed(source, True)
+        yield from pending
+        return
+
+    while True:
+        chunk = source.read(chunk_size)
+        feed(chunk, not chunk)
+        yield from pending
+        pending.clear()
+        if not chunk:
+            return
+
+
+def tree_events(element, skip=None):
+    """
+    Yield the same events as ``iter_events`` for an ElementTree element.
+
+    Works with stdlib and lxml elements alike. A direct child given as
+    ``skip`` is left out, apart from its tail.
+    """
+    yield 'start', element.tag, element.attrib
+    if element.text:
+        yield 'text', element.text, None
+    for child in element:
+        # Comments and processing instructions from lxml have no string tag
+        if child is not skip and isinstance(child.tag, str):
+            yield from tree_events(child)
+        if child.tail:
+            yield 'text', child.tail, None
+    yield 'end', element.tag, None
+
+
+class _Buffer:
+    """Text collected for one open item; ``join`` is set after an end-of-line hyphen."""
+    __slots__ = ('parts', 'join')
+
+    def __init__(self):
+        self.parts = []
+        self.join = False
+
+    def add(self, text):
+        if self.join:
+            text = text.lstrip()
+            if not text:
+                return
+            self.join = False
+        self.parts.append(text)
+
+    def join_next(self):
+        self.parts = [''.join(self.parts).rstrip()]
+        self.join = True
+
+    def text(self):
+        return ' '.join(''.join(self.parts).split())
+
+
+def transform(events, gap_marks=True, body_only=True):
+    """
+    Turn TEI parse events into chapter and item events.
+
+    With ``body_only`` only the contents of <body> elements are emitted, so
+    whole documents can be passed in; fragments such as a single <div> are
+    transformed with it off. Gaps become ``[desc]`` markers, or are dropped
+    when ``gap_marks`` is False, and words split by an EOLhyphen <g> are
+    joined back together. Text outside any block element is emitted as a
+    'p' item of its own.
+    """
+    # One frame per open element: (name, action, extra)
+    frames = []
+    # Text sinks; None discards text, e.g. inside notes
+    sinks = []
+    loose = _Buffer()
+    # Depths of open chapter divs, and whether their title has been seen
+    open_chapters = []
+    # Depth of the open section div, and whether its title has been seen
+    open_section = None
+    active = 0 if body_only else 1
+
+    def flush_loose():
+        loose_text = loose.text()
+        loose.parts = []
+        loose.join = False
+        if loose_text:
+            return 'item', 'p', loose_text
+        return None
+
+    for event, value, attrib in events:
+        if event == 'text':
+            if not active:
+                continue
+            sink = sinks[-1] if sinks else loose
+            if sink is not None:
+                sink.add(value)
+            continue
+
+        if event == 'start':
+            name = local_name(value)
+            depth = len(frames)
+            if name == 'body':
+                active += 1
+            if not active:
+                frames.append((name, None, None))
+                continue
+
+            if name in DIVISIONS or name in BLOCKS:
+                if not sinks:
+                    item = flush_loose()
+                    if item:
+                        yield item
+
+            if name == 'div' and depth and frames[-1][0] == 'body':
+                open_section = [depth, False]
+                yield 'section_start', attrib.get('type') or '', None
+
+            if name in BLOCKS:
+                # Blocks inside skipped text, such as a paragraph in a note, still get an item
+                sinks.append(_Buffer())
+                title = None
+                if name == 'head' and open_section is not None \
+                        and open_section[0] == depth - 1 and not open_section[1]:
+                    open_section[1] = True
+                    title = 'section'
+                if name == 'head' and open_chapters \
+                        and open_chapters[-1][0] == depth - 1 and not open_chapters[-1][1]:
+                    # A section title is also the title of a chapter div it heads
+                    open_chapters[-1][1] = True
+                    title = title or 'chapter'
+                frames.append((name, 'block', title))
+            elif name in SKIPPED:
+                sinks.append(None)
+                frames.append((name, 'skip', None))
+            elif name == 'gap':
+                sinks.append(_Buffer())
+                frames.append((name, 'gap', None))
+            elif name == 'g' and 'EOLhyphen' in (attrib.get('ref') or ''):
+                frames.append((name, 'hyphen', None))
+            elif name == 'div' and attrib.get('type') == 'chapter':
+                open_chapters.append([depth, False])
+                frames.append((name, 'chapter', None))
+                yield 'chapter_start', None, None
+            else:
+                frames.append((name, None, None))
+            continue
+
+        # end
+        name, action, extra = frames.pop()
+        if action == 'block':
+            item_text = sinks.pop().text()
+            if extra == 'section':
+                yield 'section_title', 'head', item_text
+            elif item_text:
+                if extra == 'chapter':
+                    yield 'chapter_title', 'head', item_text
+                else:
+                    yield 'item', BLOCKS[name], item_text
+        elif action == 'skip':
+            sinks.pop()
+        elif action == 'gap':
+            desc = sinks.pop().text()
+            if gap_marks:
+                sink = sinks[-1] if sinks else loose
+                if sink is not None:
+                    sink.add(f"[{desc or 'gap'}]")
+        elif action == 'hyphen':
+            sink = sinks[-1] if sinks else loose
+            if sink is not None:
+                sink.join_next()
+        elif action == 'chapter':
+            if not sinks:
+                item = flush_loose()
+                if item:
+                    yield item
+            open_chapters.pop()
+            yield 'chapter_end', None, None
+        elif name in DIVISIONS and active and not sinks:
+            item = flush_loose()
+            if item:
+                yield item
+
+        if open_section is not None and len(frames) == open_section[0]:
+            open_section = None
+            yield 'section_end', None, None
+
+        if name == 'body' and active:
+            active -= 1
+
+    item = flush_loose()
+    if item:
+        yield item
+
+
+def sections(events):
+    """
+    Collect (title, items) for every <div> directly inside <body>, in document order.
+
+    Items are collected as by ``items``; the section's own title is left
+    out of them. Sections without items are kept, so positions match the
+    section index. Content outside any section is left out, unless the
+    body has no sections at all, when it forms a single one.
+    """
+    result = []
+    loose = []
+    current = None
+    for event, kind, text in events:
+        if event == 'section_start':
+            current = [None, kind, []]
+        elif event == 'section_end':
+            result.append((section_title(current[0], current[1], len(result)), current[2]))
+            current = None
+        elif event == 'section_title':
+            current[0] = text
+        elif event in ('item', 'chapter_title'):
+            (current[2] if current is not None else loose).append((kind, text))
+    if not result and loose:
+        result.append((section_title(None, '', 0), loose))
+    return result
+
+
+def items(events):
+    """Collect every item as (kind, text), with chapter and section titles as headings."""
+    return [(kind, text) for event, kind, text in events if event in ('item', 'chapter_title', 'section_title')
+            and text]
+
+
+def text(events):
+    """Join the text of every item, for indexing."""
+    return ' '.join(item_text for event, _, item_text in events
+                    if event in ('item', 'chapter_title', 'section_title') and item_text)
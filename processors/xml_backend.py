@@ -0,0 +1,121 @@
+# processors/xml_backend.py
+"""
+XML parsing backend: lxml when it is installed, the standard library otherwise.
+
+lxml parses with ``huge_tree`` so very large EEBO files aren't rejected,
+evaluates paths as precompiled XPath objects and gets element text in C.
+Parse errors are raised as ElementTree.ParseError whichever backend is
+in use, so callers only handle one exception type.
+"""
+import threading
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree
+except ImportError:  # the stdlib backend works everywhere
+    etree = None
+
+NAMESPACES = {'tei': 'http://www.tei-c.org/ns/1.0'}
+
+_lxml = etree is not None
+_local = threading.local()
+
+
+def backend():
+    """Return the name of the backend in use."""
+    return 'lxml' if _lxml else 'stdlib'
+
+
+def set_backend(name):
+    """Switch between 'lxml' and 'stdlib', e.g. to compare them."""
+    global _lxml
+    if name == 'lxml' and etree is None:
+        raise RuntimeError("lxml is not installed")
+    if name not in ('lxml', 'stdlib'):
+        raise ValueError(f"Unknown XML backend: {name}")
+    _lxml = name == 'lxml'
+
+
+def _parser():
+    # lxml parsers keep state while parsing, so each thread gets its own
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = etree.XMLParser(huge_tree=True, resolve_entities=False, no_network=True)
+    return parser
+
+
+def parse(source):
+    """Parse a path or binary file object and return the root element."""
+    if not _lxml:
+        return ET.parse(source).getroot()
+    try:
+        return etree.parse(source, _parser()).getroot()
+    except etree.XMLSyntaxError as e:
+        raise ET.ParseError(str(e)) from e
+
+
+def fromstring(data):
+    """Parse XML bytes and return the root element."""
+    if not _lxml:
+        return ET.fromstring(data)
+    try:
+        return etree.fromstring(data, _parser())
+    except etree.XMLSyntaxError as e:
+        raise ET.ParseError(str(e)) from e
+
+
+def iterparse(source, events=('end',)):
+    """Incrementally parse a path or binary file object, yielding (event, element)."""
+    if not _lxml:
+        return ET.iterparse(source, events=events)
+    return _lxml_iterparse(source, events)
+
+
+def _lxml_iterparse(source, events):
+    try:
+        yield from etree.iterparse(source, events=events, huge_tree=True, resolve_entities=False,
+                                   no_network=True)
+    except etree.XMLSyntaxError as e:
+        raise ET.ParseError(str(e)) from e
+
+
+def is_element(node):
+    """Return True for elements, False for the comments and processing instructions lxml keeps."""
+    return isinstance(node.tag, str)
+
+
+class Path:
+    """
+    An element path compiled once and evaluated against either backend.
+
+    ``path`` uses the ElementPath subset shared by both, with the ``tei``
+    prefix for the TEI namespace, e.g. ``.//tei:sourceDesc//tei:date``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._xpath = etree.XPath(path, namespaces=NAMESPACES) if etree is not None else None
+
+    def findall(self, element):
+        if self._xpath is not None and isinstance(element, etree._Element):
+            return self._xpath(element)
+        return element.findall(self.path, NAMESPACES)
+
+    def find(self, element):
+        if element is None:
+            return None
+        if self._xpath is not None and isinstance(element, etree._Element):
+            found = self._xpath(element)
+            return found[0] if found else None
+        return element.find(self.path, NAMESPACES)
+
+
+if etree is not None:
+    _string_value = etree.XPath('string()')
+
+
+def text_content(element):
+    """Return all the text inside an element, like ''.join(element.itertext())."""
+    if etree is not None and isinstance(element, etree._Element):
+        return _string_value(element)
+    return ''.join(element.itertext())
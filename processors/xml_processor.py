@@ -1,4 +1,19 @@
-from xml.etree import ElementTree as ET
+import html
+from processors import tei_transformer as tei, xml_backend
+from processors.xml_backend import Path
+
+# PlayShakespeare.com play paths
+PLAY_TITLE = Path('.//title')
+PERSONAE = Path('.//persname')
+SPEAKERS = Path('.//speaker')
+
+# Inline elements rendered in italics inside play lines
+ITALIC_TAGS = {'i', 'em', 'foreign'}
+
+# Version of the structures XMLProcessor returns. Bump it whenever their shape
+# or content changes, so renders cached by older code are not served.
+# 2: EEBO works are divided into top-level body divs rather than chapters
+OUTPUT_VERSION = 2
 
 
 class XMLProcessor:
@@ -13,135 +28,171 @@ class XMLProcessor:
         """Process text while preserving historical marks and hyphenation"""
         if element is None:
             return ""
+        return tei.text(tei.transform(tei.tree_events(element), body_only=False))
 
-        # Collect text and inline elements
-        text_parts = []
-        for item in element.iter():
-            if item.tag == 'g':  # Handle `<g>` elements
-                ref = item.get('ref', '')
-                if 'EOLhyphen' in ref:  # Join hyphenated words
-                    prev_text = item.tail or ''
-                    next_elem = item.getnext()
-                    if next_elem is not None:
-                        next_text = next_elem.text or ''
-                        text_parts.append(prev_text.rstrip() + '-' + next_text.lstrip())
-                else:
-                    continue  # Ignore non-hyphenation `<g>` elements
-            elif item.tag == 'gap':  # Handle `<gap>` (illegible text)
-                desc = item.find('desc')
-                text_parts.append(f"[{desc.text if desc is not None else 'gap'}]")
-            else:
-                text_parts.append(item.text or '')
-
-        # Normalize whitespace
-        return ' '.join(''.join(text_parts).split())
-
-    def process_eebo_content(self, root):
-        """Process EEBO-TCP XML content."""
-        content = []
-        processed_ids = set()
-
-        # Find body with namespace
-        body = root.find('.//tei:body', self.namespaces)
-        if body is None:
-            body = root.find('.//body')
-            if body is None:
-                return content
-
-        # Process all divs that are chapters or text
-        for div in body.findall('.//tei:div[@type="chapter"]', self.namespaces):
-            if id(div) not in processed_ids:
-                processed_ids.add(id(div))
-
-                # Get chapter heading
-                head = div.find('tei:head', self.namespaces) or div.find('head')
-                if head is not None:
-                    chapter_title = self.process_text_with_marks(head)
-                    chapter_content = self.process_prose_div(div)
-                    if chapter_content:
-                        content.append((chapter_title, chapter_content))
+    def process_eebo_source(self, source):
+        """Process EEBO-TCP XML from bytes, a path or a file object without building a tree."""
+        return tei.sections(tei.transform(tei.iter_events(source)))
 
-        return content
+    def parse_fragment(self, fragment):
+        """
+        Parse an element cut out of a TEI document by its byte range.
 
-    def process_poem_div(self, div):
-        """Process a poem div, handling lines and maintaining hierarchy."""
-        content = []
-        processed_ids = set()  # Track processed lines to prevent duplicates
-
-        def process_lines(lines):
-            """Helper to process lines, tracking which have been processed"""
-            line_content = []
-            for line in lines:
-                if id(line) not in processed_ids:
-                    if line.text and line.text.strip():
-                        line_content.append(("line", self.process_text_with_marks(line)))
-                    processed_ids.add(id(line))
-            return line_content
-
-        # First process lines within line groups
-        for lg in div.findall('.//tei:lg', self.namespaces):
-            content.extend(process_lines(lg.findall('tei:l', self.namespaces)))
-
-        # Then process standalone lines (not in line groups)
-        for line in div.findall('tei:l', self.namespaces):
-            if id(line) not in processed_ids and line.text and line.text.strip():
-                content.append(("line", self.process_text_with_marks(line)))
-                processed_ids.add(id(line))
+        The fragment lacks the namespace declaration of the document root,
+        so it is wrapped in a TEI element that supplies it.
+        """
+        wrapper = xml_backend.fromstring(b'<TEI xmlns="http://www.tei-c.org/ns/1.0">' + fragment + b'</TEI>')
+        return wrapper[0]
 
-        return content
+    def process_eebo_section(self, div):
+        """
+        Process a single top-level division of an EEBO-TCP body into display items.
+
+        Its own first <head> is left out, since that is the section title.
+        """
+        head = next((child for child in div
+                     if xml_backend.is_element(child) and tei.local_name(child.tag) == 'head'), None)
+        return tei.items(tei.transform(tei.tree_events(div, skip=head), body_only=False))
+
+    def process_poem_div(self, div):
+        """Process a poem div into its lines."""
+        return [(kind, text) for kind, text in tei.items(tei.transform(tei.tree_events(div), body_only=False))
+                if kind == 'line']
 
     def process_prose_div(self, div):
-        """Process a prose div, handling only <p> tags."""
-        content = []
-        processed_ids = set()
-
-        def process_inline(element):
-            """Process inline elements with proper nesting and unique handling."""
-            if element is None:
-                return ""
-
-            text_parts = []
-
-            # Process the element's own text
-            if element.text:
-                text_parts.append(element.text)
-
-            # Process child elements
-            for child in element:
-                # Skip if already processed
-                if id(child) in processed_ids:
-                    continue
-
-                if child.tag.endswith('hi'):
-                    text_parts.append(process_inline(child))
-                elif child.tag.endswith('gap'):
-                    desc = child.find('desc')
-                    if desc is not None and desc.text:
-                        text_parts.append(f"[{desc.text}]")
-                    else:
-                        text_parts.append("[gap]")
-                elif child.tag.endswith('g'):
-                    ref = child.get('ref', '')
-                    if 'EOLhyphen' in ref:
-                        text_parts.append('-')
-
-                processed_ids.add(id(child))
-
-                # Add any tail text
-                if child.tail:
-                    text_parts.append(child.tail)
-
-            return ' '.join(''.join(text_parts).split())
-
-        # Process all paragraphs within the div
-        for p in div.findall('.//tei:p', self.namespaces):
-            if id(p) not in processed_ids:
-                text = process_inline(p)
-                if text and text.strip():
-                    content.append(('p', text.strip()))
-                    processed_ids.add(id(p))
+        """Process a prose div, keeping only paragraphs."""
+        return [(kind, text) for kind, text in tei.items(tei.transform(tei.tree_events(div), body_only=False))
+                if kind == 'p']
+
+    def process_play_content(self, root):
+        """
+        Process a PlayShakespeare.com play into the structure play.html renders.
+
+        Returns a dict with the play ``title``, its ``acts`` (each with an
+        ``act_title`` and ``scenes`` of speeches and stage directions) and
+        ``character_mappings`` from abbreviated speaker names to full names.
+        Lines are returned as escaped HTML, keeping italics.
+        """
+        title_elem = PLAY_TITLE.find(root)
+        title = ' '.join(xml_backend.text_content(title_elem).split()) if title_elem is not None else "Untitled"
+
+        # Acts may sit under a wrapper element rather than the root
+        container = next((elem for elem in root.iter() if self._child(elem, 'act') is not None), root)
+        acts = []
+        for child in container:
+            if not xml_backend.is_element(child):
+                continue
+            if child.tag == 'act':
+                acts.append(self._play_act(child, len(acts) + 1))
+            elif child.tag not in ('title', 'playwright', 'edition', 'personae') \
+                    and next(child.iter('speech'), None) is not None:
+                # Prologues, inductions and epilogues outside any act
+                section_title = self._section_title(child)
+                acts.append({
+                    'act_title': section_title,
+                    'scenes': [{'scene_title': None, 'content': self._scene_content(child)}]
+                })
+
+        return {
+            'title': title,
+            'acts': acts,
+            'character_mappings': self._character_mappings(root)
+        }
 
-        return content
+    def _child(self, element, tag):
+        return next((child for child in element if child.tag == tag), None)
+
+    def _section_title(self, element, default=None):
+        for tag in ('acttitle', 'scenetitle', 'title'):
+            title_elem = self._child(element, tag)
+            if title_elem is not None:
+                return ' '.join(xml_backend.text_content(title_elem).split())
+        return default or element.tag.capitalize()
+
+    def _play_act(self, act, number):
+        scenes = []
+        loose = []
+        for child in act:
+            if not xml_backend.is_element(child) or child.tag == 'acttitle':
+                continue
+            if child.tag in ('speech', 'stagedir'):
+                loose.extend(self._scene_content(child, include_self=True))
+            elif next(child.iter('speech'), None) is not None or next(child.iter('stagedir'), None) is not None:
+                if loose:
+                    scenes.append({'scene_title': None, 'content': loose})
+                    loose = []
+                scene_title = self._section_title(child)
+                location = self._child(child, 'scenelocation')
+                if location is not None and location.text and location.text.strip():
+                    scene_title = f"{scene_title}. {' '.join(location.text.split())}"
+                scenes.append({'scene_title': scene_title, 'content': self._scene_content(child)})
+        if loose:
+            scenes.append({'scene_title': None, 'content': loose})
+
+        return {
+            'act_title': self._section_title(act, f"Act {act.get('num', number)}"),
+            'scenes': scenes
+        }
 
+    def _scene_content(self, element, include_self=False):
+        """List the speeches and stage directions in an element, in document order."""
+        content = []
+        children = [element] if include_self else list(element)
+        for child in children:
+            if not xml_backend.is_element(child):
+                continue
+            if child.tag == 'speech':
+                content.append(self._speech(child))
+            elif child.tag == 'stagedir':
+                text = ' '.join(xml_backend.text_content(child).split())
+                if text:
+                    content.append({'type': 'stagedir', 'text': text})
+            elif child.tag not in ('acttitle', 'scenetitle', 'scenelocation', 'title'):
+                content.extend(self._scene_content(child))
+        return content
 
+    def _speech(self, speech):
+        speaker = self._child(speech, 'speaker')
+        lines = []
+        for child in speech:
+            if not xml_backend.is_element(child):
+                continue
+            if child.tag == 'line':
+                line = self._line_html(child)
+                if line:
+                    lines.append(line)
+            elif child.tag == 'stagedir':
+                # Stage directions within a speech stay in place, between its lines
+                text = ' '.join(xml_backend.text_content(child).split())
+                if text:
+                    lines.append(f'<span class="stage-direction">[{html.escape(text)}]</span>')
+        return {
+            'type': 'speech',
+            'speaker': ' '.join(xml_backend.text_content(speaker).split()) if speaker is not None else '',
+            'lines': lines
+        }
 
+    def _line_html(self, line):
+        """Render a line as escaped HTML, with italic inline elements as <em>."""
+        parts = [html.escape(line.text or '')]
+        for child in line:
+            if xml_backend.is_element(child):
+                text = html.escape(xml_backend.text_content(child))
+                parts.append(f'<em>{text}</em>' if child.tag in ITALIC_TAGS else text)
+            parts.append(html.escape(child.tail or ''))
+        return ' '.join(''.join(parts).split())
+
+    def _character_mappings(self, root):
+        """Map abbreviated speaker names to full names, from the personae list and speaker tags."""
+        mappings = {}
+        for persname in PERSONAE.findall(root):
+            short = persname.get('short')
+            full = ' '.join(xml_backend.text_content(persname).split())
+            if short and full:
+                mappings.setdefault(short, full)
+        for speaker in SPEAKERS.findall(root):
+            short = ' '.join(xml_backend.text_content(speaker).split())
+            full = speaker.get('long')
+            if short and full:
+                mappings.setdefault(short, full)
+        return [{'short': short, 'full': full} for short, full in mappings.items()]
@@ -1,15 +1,18 @@
 # routes/main.py
 
-from flask import render_template, request, abort, current_app
+from flask import render_template, stream_template, request, abort, current_app, jsonify, url_for, session, send_file
 from models import db
-from models.work import Work
+from models.work import Work, WorkSection
 from models.blog import BlogPost
 from models.forum import Topic
 from processors.xml_processor import XMLProcessor
-import os
+from processors import xml_backend
+from storage import sources, render_cache, snapshots
+from section_index import current_sections, read_section
 from xml.etree import ElementTree as ET
 import re
 import html
+import hashlib
 from urllib.parse import urlencode
 
 def strip_html_tags(text):
@@ -28,8 +31,50 @@ def update_url(**new_params):
             params[key] = value
     return f"{request.path}?{urlencode(params, doseq=True)}"
 
+def work_etag(work, personalized=True):
+    """
+    Return the ETag of a page built from a work, or None if its source is missing.
+
+    The ETag covers everything the page depends on: the source version,
+    whether it has a current section index, the displayed metadata, the
+    template version and, for full pages, whether the reader is logged
+    in. Only a stat (or an archive lookup) and one small query are
+    needed, so the XML is never read. No Last-Modified is sent: the
+    source mtime is the only date there is, and it misses changes to the
+    metadata, the section index and the templates that the ETag covers.
+    """
+    version = sources.version(work.id, work.file_path)
+    if version is None:
+        return None
+
+    section_version = db.session.query(WorkSection.source_version) \
+        .filter_by(work_id=work.id, position=0).scalar()
+    parts = [version, 'sections' if section_version == version else 'whole',
+             work.title, work.author, work.publication_year, work.tcp_id,
+             current_app.config['TEMPLATE_VERSION']]
+    if personalized:
+        parts.append('user' if session.get('user_id') else 'anonymous')
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def buffered(chunks, size=16 * 1024):
+    """Group the many small chunks of a streamed template into writes of about ``size`` characters."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
 def register_routes(app):
     xml_processor = XMLProcessor()
+    # Bump TEMPLATE_VERSION when work templates change, to invalidate cached pages
+    app.config.setdefault('TEMPLATE_VERSION', '1')
+    app.config.setdefault('WORK_CACHE_MAX_AGE', 3600)
 
     @app.route('/')
     def home():
@@ -56,6 +101,8 @@ def register_routes(app):
         sort = request.args.get('sort', 'relevance')
         year_from = request.args.get('year_from', type=int)
         year_to = request.args.get('year_to', type=int)
+        # Fuzzy matching over work content is slow, so readers opt in to it
+        fuzzy = request.args.get('fuzzy') == '1'
 
         try:
             filters = {}
@@ -84,7 +131,8 @@ def register_routes(app):
                 filters=filters,
                 sort=sort,
                 page=page,
-                per_page=20
+                per_page=20,
+                fuzzy=fuzzy
             )
 
             return render_template(
@@ -113,34 +161,199 @@ def register_routes(app):
                 active_filters=[]
             )
 
+    def load_work_content(work):
+        """
+        Return the processed structure of a work, from the render cache when possible.
+
+        Returns None if the source can't be found.
+        """
+        version = sources.version(work.id, work.file_path)
+        if version is None:
+            return None
+
+        content = render_cache.get(work.id, version)
+        if content is None:
+            data = sources.read(work.id, work.file_path)
+            if data is None:
+                return None
+            if work.collection == 'EEBO-TCP':
+                content = xml_processor.process_eebo_source(data)
+            else:
+                content = xml_processor.process_play_content(xml_backend.fromstring(data))
+            content = render_cache.put(work.id, version, content)
+        return content
+
+    def cache_headers(response, etag, personalized=True):
+        """Set the ETag and Cache-Control on a work page response."""
+        # Weak, since the plain, gzip and brotli bodies of a page share it
+        response.set_etag(etag, weak=True)
+        # Pages for logged-in readers differ in the navigation, so proxies must not share them.
+        # They are streamed, and a template error part way through can only cut the page
+        # short, so they are not stored at all
+        if personalized and session.get('user_id'):
+            response.cache_control.private = True
+            response.cache_control.no_store = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config['WORK_CACHE_MAX_AGE']
+        response.vary.add('Cookie')
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def not_modified(etag, personalized=True):
+        """Return a 304 response if the client's copy is current, else None."""
+        response = cache_headers(current_app.response_class(), etag, personalized)
+        response.make_conditional(request)
+        return response if response.status_code == 304 else None
+
+    def snapshot_response(work, etag):
+        """
+        Serve the prebuilt snapshot of a work page, or return None to render it live.
+
+        Snapshots are built for anonymous readers and stored gzipped and,
+        when brotli is installed, brotli-compressed; the client's preferred
+        one of those it accepts is sent as is. With SNAPSHOT_ACCEL_PREFIX set
+        the file is handed to the front server with X-Accel-Redirect;
+        otherwise it is sent from here.
+        """
+        if session.get('user_id'):
+            return None
+        encoding = request.accept_encodings.best_match(snapshots.encodings(work.id, etag))
+        if encoding is None:
+            return None
+
+        if snapshots.accel_prefix:
+            response = current_app.response_class(mimetype='text/html')
+            response.headers['X-Accel-Redirect'] = snapshots.accel_prefix.rstrip('/') + '/' + \
+                snapshots.relative_path(work.id, etag, encoding)
+        else:
+            path = snapshots.find(work.id, etag, encoding)
+            response = send_file(path, mimetype='text/html', conditional=False, etag=False, max_age=None)
+            # The snapshot's mtime is not the page's; the ETag alone validates it
+            response.headers.remove('Last-Modified')
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def load_eebo_section(work, index=None):
+        """
+        Return (titles, section) for an EEBO work, or None if the source can't be found.
+
+        ``titles`` lists every section and ``section`` is the (title, content)
+        of section ``index``, or None. Works with a current section index
+        only parse the bytes of the requested section; the others are
+        processed whole through the render cache.
+        """
+        sections = current_sections(work)
+        if sections:
+            section = None
+            if index is not None and index < len(sections):
+                data = read_section(work, sections[index])
+                if data is None:
+                    return None
+                div = xml_processor.parse_fragment(data)
+                section = (sections[index].title, xml_processor.process_eebo_section(div))
+            return [s.title for s in sections], section
+
+        content = load_work_content(work)
+        if content is None:
+            return None
+        section = content[index] if index is not None and index < len(content) else None
+        return [section_title for section_title, _ in content], section
+
     @app.route('/work/<int:work_id>')
     def render_work(work_id):
         work = Work.query.get_or_404(work_id)
-        if not os.path.exists(work.file_path):
+
+        etag = work_etag(work)
+        if etag is None:
             abort(404, description="File not found")
+        response = not_modified(etag)
+        if response is not None:
+            return response
 
-        try:
-            tree = ET.parse(work.file_path)
-            root = tree.getroot()
+        response = snapshot_response(work, etag)
+        if response is not None:
+            return cache_headers(response, etag)
 
+        # Content is loaded up front so parse errors surface before any of the page is sent
+        try:
             if work.collection == 'EEBO-TCP':
-                content = xml_processor.process_eebo_content(root)
-                # Debugging: Print the content structure to the console
-
-                return render_template("eebo_work.html",
-                                       work=work,
-                                       content=content)
+                # Only the first section is rendered; the page loads the rest on demand
+                loaded = load_eebo_section(work, 0)
+                if loaded is None:
+                    abort(404, description="File not found")
+                toc, section = loaded
+                template = "eebo_work.html"
+                context = dict(work=work, content=[section] if section else [], toc=toc)
             else:
-                play_content = xml_processor.process_play_content(root)
-                # Debugging: Print the play content structure to the console
+                content = load_work_content(work)
+                if content is None:
+                    abort(404, description="File not found")
+                template = "play.html"
+                context = dict(work=work,
+                               play_title=content['title'],
+                               acts=content['acts'],
+                               character_mappings=content['character_mappings'])
+
+            if not session.get('user_id'):
+                # Publicly cached, so only a fully rendered page may be sent
+                return cache_headers(current_app.response_class(render_template(template, **context),
+                                                                mimetype='text/html'), etag)
+
+            # Streamed so the browser gets the head while the rest renders
+            page = stream_template(template, **context)
+            return cache_headers(current_app.response_class(buffered(page), mimetype='text/html'), etag)
+
+        except ET.ParseError:
+            abort(500, description="Error parsing XML file")
 
-                return render_template("play.html",
-                                       work=work,
-                                       play_title=play_content['title'],
-                                       acts=play_content['acts'],
-                                       character_mappings=play_content['character_mappings'])
+    def load_eebo_sections(work_id, index=None):
+        work = Work.query.get_or_404(work_id)
+        if work.collection != 'EEBO-TCP':
+            abort(404, description="Sections are only available for EEBO-TCP works")
 
+        etag = work_etag(work, personalized=False)
+        if etag is None:
+            abort(404, description="File not found")
+        response = not_modified(etag, personalized=False)
+        if response is not None:
+            abort(response)
+
+        try:
+            loaded = load_eebo_section(work, index)
         except ET.ParseError:
             abort(500, description="Error parsing XML file")
+        if loaded is None:
+            abort(404, description="File not found")
+        return work, loaded[0], loaded[1], etag
+
+    @app.route('/work/<int:work_id>/toc')
+    def work_toc(work_id):
+        work, toc, _, etag = load_eebo_sections(work_id)
+        return cache_headers(jsonify({
+            'work_id': work.id,
+            'sections': [
+                {
+                    'index': index,
+                    'title': section_title,
+                    'url': url_for('work_section', work_id=work.id, index=index)
+                }
+                for index, section_title in enumerate(toc)
+            ]
+        }), etag, personalized=False)
+
+    @app.route('/work/<int:work_id>/section/<int:index>')
+    def work_section(work_id, index):
+        work, _, section, etag = load_eebo_sections(work_id, index)
+        if section is None:
+            abort(404, description="Section not found")
+
+        section_title, section_content = section
+        return cache_headers(jsonify({
+            'work_id': work.id,
+            'index': index,
+            'title': section_title,
+            'content': section_content
+        }), etag, personalized=False)
 
     return app
\ No newline at end of file
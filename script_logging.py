@@ -0,0 +1,36 @@
+# script_logging.py
+"""
+Logging for the command-line scripts.
+
+Scripts call ``setup_logging`` from their ``__main__`` block only: under
+the spawn start method every worker process re-imports the script, and
+logging set up at import time would give each worker a log file of its
+own. Process pools are instead created with ``**worker_logging()``, so
+their workers append to the run's log file.
+"""
+import logging
+from datetime import datetime
+
+
+def setup_logging(log_filename=None):
+    """Log to the console and, when given, to a file."""
+    handlers = [logging.StreamHandler()]
+    if log_filename:
+        handlers.insert(0, logging.FileHandler(log_filename))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
+def run_log_filename(prefix):
+    """Timestamped log file name for a run of a script."""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+
+
+def worker_logging():
+    """ProcessPoolExecutor arguments that send worker logs to this process's log file."""
+    log_files = [handler.baseFilename for handler in logging.getLogger().handlers
+                 if isinstance(handler, logging.FileHandler)]
+    return {'initializer': setup_logging, 'initargs': (log_files[0] if log_files else None,)}
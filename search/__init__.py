@@ -1,19 +1,30 @@
+import json
 import logging
+import queue
+import threading
+import time
 from elasticsearch import Elasticsearch
 from elasticsearch.exceptions import NotFoundError
 from elasticsearch_dsl import Search, Q, A
 from flask import current_app
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
+from normalization import normalize_text
 
 logger = logging.getLogger(__name__)
 
 
+def load_synonyms(path):
+    """Read a Solr-format synonym file written by mine_variants.py, skipping comments."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
 class SearchClient:
     def __init__(self, app=None):
         self.es = None
-        self._index_lock = threading.Lock()
+        # Spelling variant synonyms mined by mine_variants.py
+        self.variant_synonyms = None
         if app is not None:
             self.init_app(app)
 
@@ -22,6 +33,24 @@ class SearchClient:
         app.config.setdefault('ELASTICSEARCH_URL', 'http://localhost:9200')
         app.config.setdefault('ELASTICSEARCH_INDEX', 'works')
         app.config.setdefault('ELASTICSEARCH_THREAD_POOL_SIZE', 4)
+        app.config.setdefault('ELASTICSEARCH_BULK_CHUNK_SIZE', 500)
+        app.config.setdefault('ELASTICSEARCH_BULK_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('ELASTICSEARCH_BULK_CONCURRENCY', app.config['ELASTICSEARCH_THREAD_POOL_SIZE'])
+        app.config.setdefault('ELASTICSEARCH_BULK_MAX_RETRIES', 3)
+        app.config.setdefault('ELASTICSEARCH_EXTRACT_WORKERS', 4)
+        app.config.setdefault('ELASTICSEARCH_PIPELINE_QUEUE_SIZE', 100)
+        app.config.setdefault('ELASTICSEARCH_REFRESH_INTERVAL', '1s')
+        app.config.setdefault('ELASTICSEARCH_NUMBER_OF_REPLICAS', 1)
+        app.config.setdefault('ELASTICSEARCH_KEEP_INDEX_VERSIONS', 1)
+        app.config.setdefault('VARIANT_SYNONYMS_PATH', None)
+
+        path = app.config['VARIANT_SYNONYMS_PATH']
+        if path:
+            try:
+                self.variant_synonyms = load_synonyms(path)
+                logger.info(f"Loaded {len(self.variant_synonyms)} spelling variant synonyms from {path}")
+            except OSError as e:
+                logger.warning(f"Could not load spelling variant synonyms from {path}: {str(e)}")
 
         self.es = Elasticsearch(app.config['ELASTICSEARCH_URL'])
         self.setup_index(app.config['ELASTICSEARCH_INDEX'])
@@ -29,179 +58,317 @@ class SearchClient:
         # Make the client available at the app level
         app.elasticsearch = self
 
-    def setup_index(self, index_name):
-        """Create the index with proper mappings for Early Modern English text."""
-        if not self.es.indices.exists(index=index_name):
-            settings = {
-                "settings": {
-                    "analysis": {
-                        "char_filter": {
-                            "early_modern_char": {
-                                "type": "mapping",
-                                "mappings": [
-                                    "ſ => s",
-                                    "æ => ae",
-                                    "œ => oe",
-                                    "ƿ => w",
-                                    "þ => th",
-                                    "ð => d",
-                                    "ȝ => y"
-                                ]
-                            }
-                        },
-                        "filter": {
-                            "early_modern_synonyms": {
-                                "type": "synonym",
-                                "synonyms": [
-                                    "ye, the",
-                                    "thou, you",
-                                    "thee, you",
-                                    "thy, your",
-                                    "thine, your",
-                                    "hath, has",
-                                    "doth, does",
-                                    "wilt, will",
-                                    "art, are",
-                                    "nay, no",
-                                    "ay, yes"
-                                ]
-                            },
-                            "early_modern_stop": {
-                                "type": "stop",
-                                "stopwords": ["thee", "thou", "ye", "hath", "doth", "thy", "thine"]
-                            }
+    def index_body(self):
+        """Settings and mappings for an index of Early Modern English text."""
+        body = {
+            "settings": {
+                "analysis": {
+                    "char_filter": {
+                        "early_modern_char": {
+                            "type": "mapping",
+                            "mappings": [
+                                "ſ => s",
+                                "æ => ae",
+                                "œ => oe",
+                                "ƿ => w",
+                                "þ => th",
+                                "ð => d",
+                                "ȝ => y"
+                            ]
+                        }
+                    },
+                    "filter": {
+                        "early_modern_synonyms": {
+                            "type": "synonym",
+                            "synonyms": [
+                                "ye, the",
+                                "thou, you",
+                                "thee, you",
+                                "thy, your",
+                                "thine, your",
+                                "hath, has",
+                                "doth, does",
+                                "wilt, will",
+                                "art, are",
+                                "nay, no",
+                                "ay, yes"
+                            ]
                         },
-                        "analyzer": {
-                            "early_modern_english": {
-                                "type": "custom",
-                                "char_filter": ["early_modern_char"],
-                                "tokenizer": "standard",
-                                "filter": [
-                                    "lowercase",
-                                    "asciifolding",
-                                    "early_modern_stop",
-                                    "early_modern_synonyms",
-                                    "snowball"
-                                ]
-                            }
+                        "early_modern_stop": {
+                            "type": "stop",
+                            "stopwords": ["thee", "thou", "ye", "hath", "doth", "thy", "thine"]
                         }
                     },
-                    "index": {
-                        "max_ngram_diff": 3
+                    "analyzer": {
+                        "early_modern_english": {
+                            "type": "custom",
+                            "char_filter": ["early_modern_char"],
+                            "tokenizer": "standard",
+                            "filter": [
+                                "lowercase",
+                                "asciifolding",
+                                "early_modern_stop",
+                                "early_modern_synonyms",
+                                "snowball"
+                            ]
+                        },
+                        # For text already normalized in Python (normalization.py)
+                        "normalized_text": {
+                            "type": "custom",
+                            "tokenizer": "standard",
+                            "filter": ["lowercase"]
+                        }
                     }
                 },
-                "mappings": {
-                    "properties": {
-                        "title": {
-                            "type": "text",
-                            "analyzer": "early_modern_english",
-                            "fields": {
-                                "raw": {"type": "keyword"},
-                                "suggest": {
-                                    "type": "completion",
-                                    "analyzer": "early_modern_english"
-                                },
-                                "ngram": {
-                                    "type": "text",
-                                    "analyzer": "early_modern_english"
-                                }
+                "index": {
+                    "max_ngram_diff": 3
+                }
+            },
+            "mappings": {
+                # The normalized copy of the content is only searched, never returned
+                "_source": {
+                    "excludes": ["content_normalized"]
+                },
+                "properties": {
+                    "title": {
+                        "type": "text",
+                        "analyzer": "early_modern_english",
+                        "fields": {
+                            "raw": {"type": "keyword"},
+                            "suggest": {
+                                "type": "completion",
+                                "analyzer": "early_modern_english"
+                            },
+                            "ngram": {
+                                "type": "text",
+                                "analyzer": "early_modern_english"
                             }
-                        },
-                        "author": {
-                            "type": "text",
-                            "analyzer": "early_modern_english",
-                            "fields": {
-                                "raw": {"type": "keyword"},
-                                "suggest": {
-                                    "type": "completion",
-                                    "analyzer": "early_modern_english"
-                                }
+                        }
+                    },
+                    "author": {
+                        "type": "text",
+                        "analyzer": "early_modern_english",
+                        "fields": {
+                            "raw": {"type": "keyword"},
+                            "suggest": {
+                                "type": "completion",
+                                "analyzer": "early_modern_english"
                             }
-                        },
-                        "content": {
-                            "type": "text",
-                            "analyzer": "early_modern_english",
-                            "term_vector": "with_positions_offsets"
-                        },
-                        "publication_year": {
-                            "type": "integer"
-                        },
-                        "genre": {
-                            "type": "keyword"
-                        },
-                        "collection": {
-                            "type": "keyword"
-                        },
-                        "language": {
-                            "type": "keyword"
-                        },
-                        "tcp_id": {
-                            "type": "keyword"
-                        },
-                        "source_library": {
-                            "type": "keyword"
-                        },
-                        "indexed_date": {
-                            "type": "date"
                         }
+                    },
+                    "content": {
+                        "type": "text",
+                        "analyzer": "early_modern_english",
+                        "term_vector": "with_positions_offsets"
+                    },
+                    "content_normalized": {
+                        "type": "text",
+                        "analyzer": "normalized_text"
+                    },
+                    "publication_year": {
+                        "type": "integer"
+                    },
+                    "genre": {
+                        "type": "keyword"
+                    },
+                    "collection": {
+                        "type": "keyword"
+                    },
+                    "language": {
+                        "type": "keyword"
+                    },
+                    "tcp_id": {
+                        "type": "keyword"
+                    },
+                    "source_library": {
+                        "type": "keyword"
+                    },
+                    "indexed_date": {
+                        "type": "date"
                     }
                 }
             }
-            self.es.indices.create(index=index_name, body=settings)
-            logger.info(f"Created index {index_name} with Early Modern English settings")
+        }
+
+        if self.variant_synonyms:
+            # Mined by mine_variants.py: one-way rules from rare normalized forms to the usual
+            # ones, applied to queries only so the indexed text is never expanded
+            analysis = body['settings']['analysis']
+            analysis['filter']['early_modern_variants'] = {
+                "type": "synonym_graph",
+                "synonyms": self.variant_synonyms,
+                "lenient": True
+            }
+            analysis['analyzer']['normalized_search'] = {
+                "type": "custom",
+                "tokenizer": "standard",
+                "filter": ["lowercase", "early_modern_variants"]
+            }
+            body['mappings']['properties']['content_normalized']['search_analyzer'] = 'normalized_search'
+        return body
+
+    def setup_index(self, alias):
+        """
+        Make sure the alias points at an index with proper mappings.
+
+        Indices are versioned: the physical index is ``<alias>-<timestamp>``
+        and searches go through the alias. An existing index or alias with
+        the name is left alone, so older deployments keep working until
+        their first rebuild.
+        """
+        if not self.es.indices.exists(index=alias):
+            index_name = self._versioned_name(alias)
+            body = self.index_body()
+            body['aliases'] = {alias: {}}
+            self.es.indices.create(index=index_name, body=body)
+            logger.info(f"Created index {index_name} with Early Modern English settings behind alias {alias}")
+
+    def _versioned_name(self, alias):
+        return f"{alias}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+
+    def create_index_version(self, alias):
+        """
+        Create a new physical index for a rebuild, tuned for bulk loading.
+
+        Refresh is disabled and replicas are dropped until
+        finish_index_version is called. The alias is not touched, so
+        searches keep going to the current index during the rebuild.
+        """
+        index_name = self._versioned_name(alias)
+        body = self.index_body()
+        body['settings']['index'].update({
+            'refresh_interval': '-1',
+            'number_of_replicas': 0
+        })
+        self.es.indices.create(index=index_name, body=body)
+        logger.info(f"Created index {index_name} for rebuilding {alias}")
+        return index_name
+
+    def finish_index_version(self, alias, index_name):
+        """
+        Restore live settings on a rebuilt index and atomically point the alias at it.
+
+        Refresh and replicas are restored from ELASTICSEARCH_REFRESH_INTERVAL
+        and ELASTICSEARCH_NUMBER_OF_REPLICAS. If the alias name is still a
+        plain index from before versioning, that index is removed in the
+        same alias update. The index is force-merged only once it is live,
+        as a background task, since merging a whole corpus outlasts any
+        request timeout; searches are correct meanwhile, just slower.
+        Versions older than the newest ELASTICSEARCH_KEEP_INDEX_VERSIONS
+        unaliased ones are then deleted.
+        """
+        config = current_app.config
+        self.es.indices.put_settings(index=index_name, settings={
+            'index': {
+                'refresh_interval': config['ELASTICSEARCH_REFRESH_INTERVAL'],
+                'number_of_replicas': config['ELASTICSEARCH_NUMBER_OF_REPLICAS']
+            }
+        })
+        self.es.indices.refresh(index=index_name)
+
+        actions = []
+        if self.es.indices.exists_alias(name=alias):
+            for old_index in self.es.indices.get_alias(name=alias):
+                if old_index != index_name:
+                    actions.append({'remove': {'index': old_index, 'alias': alias}})
+        elif self.es.indices.exists(index=alias):
+            actions.append({'remove_index': {'index': alias}})
+        actions.append({'add': {'index': index_name, 'alias': alias}})
+
+        self.es.indices.update_aliases(actions=actions)
+        logger.info(f"Alias {alias} now points at {index_name}")
+
+        try:
+            task = self.es.indices.forcemerge(index=index_name, max_num_segments=1, wait_for_completion=False)
+            logger.info(f"Force-merging {index_name} in task {task.get('task')}")
+        except Exception as e:
+            logger.warning(f"Could not start force-merging {index_name}: {str(e)}")
+
+        try:
+            self.prune_index_versions(alias, keep=config['ELASTICSEARCH_KEEP_INDEX_VERSIONS'])
+        except Exception as e:
+            logger.warning(f"Could not delete old versions of {alias}: {str(e)}")
+
+    def prune_index_versions(self, alias, keep=1):
+        """Delete old physical versions of an alias, keeping the newest ``keep`` unaliased ones."""
+        live = set(self.es.indices.get_alias(name=alias)) if self.es.indices.exists_alias(name=alias) else set()
+        versions = sorted((name for name in self.es.indices.get(index=f"{alias}-*") if name not in live),
+                          reverse=True)
+        for index_name in versions[keep:]:
+            self.es.indices.delete(index=index_name)
+            logger.info(f"Deleted old index version {index_name}")
+
+    def content_queries(self, query_text, fuzzy=False, slop=2):
+        """
+        Return query clauses matching text against work content, any of which may match.
 
-    def build_query(self, query_text, advanced_params=None):
+        The query is normalized like the indexed content_normalized field,
+        so variant spellings meet as plain term and phrase matches. Fuzzy
+        matching over the raw content field is expensive and only added
+        when ``fuzzy`` is asked for.
+        """
+        normalized = normalize_text(query_text)
+        queries = [
+            {'match': {'content_normalized': {'query': normalized, 'minimum_should_match': '2<70%'}}},
+            {'match_phrase': {'content_normalized': {'query': normalized, 'slop': slop}}}
+        ]
+        if fuzzy:
+            queries.append({'match': {'content': {'query': query_text, 'fuzziness': 'AUTO',
+                                                  'minimum_should_match': '2<70%'}}})
+        return queries
+
+    def build_query(self, query_text, advanced_params=None, fuzzy=False):
         """Build Elasticsearch query from text and advanced parameters."""
         bool_query = Q('bool')
 
         if query_text:
+            metadata = {'fuzziness': 'AUTO'} if fuzzy else {}
             should_queries = [
                 Q('multi_match',
                   query=query_text,
-                  fields=['title^3', 'author^2', 'content'],
-                  fuzziness='AUTO',
-                  minimum_should_match='2<70%'),
+                  fields=['title^3', 'author^2'],
+                  minimum_should_match='2<70%',
+                  **metadata),
                 Q('multi_match',
                   query=query_text,
-                  fields=['title.ngram^2', 'author.ngram', 'content'],
+                  fields=['title.ngram^2', 'author.ngram'],
                   type='phrase',
                   slop=2)
-            ]
+            ] + [Q(query) for query in self.content_queries(query_text, fuzzy=fuzzy)]
             bool_query = bool_query & Q('bool', should=should_queries)
 
         if advanced_params:
             if advanced_params.get('must_terms'):
                 bool_query = bool_query & Q('bool', must=[
-                    Q('match', content={'query': term, 'analyzer': 'early_modern_english'})
+                    Q('match', content_normalized=normalize_text(term))
                     for term in advanced_params['must_terms']
                 ])
 
             if advanced_params.get('should_terms'):
                 bool_query = bool_query & Q('bool', should=[
-                    Q('match', content={'query': term, 'analyzer': 'early_modern_english'})
+                    Q('match', content_normalized=normalize_text(term))
                     for term in advanced_params['should_terms']
                 ], minimum_should_match=1)
 
             if advanced_params.get('must_not_terms'):
                 bool_query = bool_query & Q('bool', must_not=[
-                    Q('match', content={'query': term, 'analyzer': 'early_modern_english'})
+                    Q('match', content_normalized=normalize_text(term))
                     for term in advanced_params['must_not_terms']
                 ])
 
             if advanced_params.get('phrase'):
                 bool_query = bool_query & Q(
                     'match_phrase',
-                    content={
-                        'query': advanced_params['phrase'],
-                        'analyzer': 'early_modern_english',
+                    content_normalized={
+                        'query': normalize_text(advanced_params['phrase']),
                         'slop': 3
                     }
                 )
 
         return bool_query if bool_query.to_dict()['bool'] else Q('match_all')
 
-    def search(self, query=None, filters=None, sort='relevance', page=1, per_page=20):
-        """Perform a search with filters and pagination."""
+    def search(self, query=None, filters=None, sort='relevance', page=1, per_page=20, fuzzy=False):
+        """Perform a search with filters and pagination; ``fuzzy`` opts in to fuzzy matching."""
         try:
             current_app.logger.debug(f"Search called with query: {query}, filters: {filters}")
 
@@ -219,11 +386,16 @@ class SearchClient:
 
             # Add text query if provided
             if query:
+                multi_match = {
+                    "query": query,
+                    "fields": ["title^3", "author^2"]
+                }
+                if fuzzy:
+                    multi_match["fuzziness"] = "AUTO"
                 search_body["query"]["bool"]["must"].append({
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["title^3", "author^2", "content"],
-                        "fuzziness": "AUTO"
+                    "bool": {
+                        "should": [{"multi_match": multi_match}] + self.content_queries(query, fuzzy=fuzzy),
+                        "minimum_should_match": 1
                     }
                 })
 
@@ -288,69 +460,267 @@ class SearchClient:
             current_app.logger.error(f"Search error: {str(e)}", exc_info=True)
             raise
 
+    def work_document(self, work, content, normalized=None):
+        """Build the search document for a work, normalizing the content unless given."""
+        return {
+            'title': work.title,
+            'author': work.author,
+            'content': content,
+            'content_normalized': normalize_text(content) if normalized is None else normalized,
+            'publication_year': work.publication_year,
+            'tcp_id': work.tcp_id,
+            'collection': work.collection,
+            'language': work.language,
+            'genre': work.genre,
+            'source_library': work.source_library,
+            # ISO 8601, which the date mapping's default format accepts
+            'indexed_date': datetime.utcnow().isoformat()
+        }
+
     def index_work(self, work, content):
         """Index a single work with its content."""
         try:
-            with self._index_lock:
-                doc = {
-                    'title': work.title,
-                    'author': work.author,
-                    'content': content,
-                    'publication_year': work.publication_year,
-                    'tcp_id': work.tcp_id,
-                    'collection': work.collection,
-                    'language': work.language,
-                    'genre': work.genre,
-                    'source_library': work.source_library,
-                    'indexed_date': datetime.utcnow()
-                }
-
-                self.es.index(
-                    index=current_app.config['ELASTICSEARCH_INDEX'],
-                    id=str(work.id),
-                    document=doc
-                )
-                logger.info(f"Indexed work {work.id}: {work.title}")
-                return True
+            self.es.index(
+                index=current_app.config['ELASTICSEARCH_INDEX'],
+                id=str(work.id),
+                document=self.work_document(work, content)
+            )
+            logger.info(f"Indexed work {work.id}: {work.title}")
+            return True
         except Exception as e:
             logger.error(f"Error indexing work {work.id}: {str(e)}")
             return False
 
-    def reindex_all(self, works, content_extractor):
+    def _bulk_chunks(self, docs, index, chunk_size, max_chunk_bytes):
+        """Serialize documents into _bulk chunks capped by document count and bytes."""
+        chunk = []
+        chunk_bytes = 0
+        for work, content, *normalized in docs:
+            action = json.dumps({'index': {'_index': index, '_id': str(work.id)}}).encode('utf-8')
+            source = json.dumps(self.work_document(work, content, *normalized)).encode('utf-8')
+            size = len(action) + len(source) + 2
+
+            if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+
+            chunk.append((work.id, action, source))
+            chunk_bytes += size
+
+        if chunk:
+            yield chunk
+
+    def _send_bulk(self, chunk, max_retries, initial_backoff):
+        """
+        Send one _bulk request, retrying items Elasticsearch rejected with 429.
+
+        Returns a list of (work_id, error) tuples, with error None on success.
         """
-        Reindex all works using parallel processing.
+        results = []
+        pending = chunk
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(initial_backoff * 2 ** (attempt - 1))
+
+            operations = []
+            for _, action, source in pending:
+                operations.extend((action, source))
+
+            try:
+                response = self.es.bulk(operations=operations)
+            except Exception as e:
+                if attempt < max_retries:
+                    logger.warning(f"Bulk request of {len(pending)} documents failed, retrying: {str(e)}")
+                    continue
+                return results + [(work_id, str(e)) for work_id, _, _ in pending]
+
+            retry = []
+            for item, entry in zip(response['items'], pending):
+                outcome = item.get('index', {})
+                status = outcome.get('status', 500)
+                if status < 300:
+                    results.append((entry[0], None))
+                elif status == 429 and attempt < max_retries:
+                    retry.append(entry)
+                else:
+                    results.append((entry[0], json.dumps(outcome.get('error', f'status {status}'))))
+
+            if not retry:
+                return results
+            logger.warning(f"{len(retry)} documents rejected by Elasticsearch, retrying")
+            pending = retry
+
+        return results
+
+    def bulk_index(self, docs, index=None, chunk_size=None, max_chunk_bytes=None,
+                   concurrency=None, max_retries=None, initial_backoff=2, on_result=None):
+        """
+        Index works through the _bulk API.
 
         Args:
-            works: Iterable of work objects
-            content_extractor: Function to extract content from a work
+            docs: Iterable of (work, content) pairs, consumed lazily, or of
+                (work, content, normalized_content) when the content has
+                already been normalized, e.g. in extraction processes
+            index: Target index, defaults to ELASTICSEARCH_INDEX
+            chunk_size: Maximum documents per _bulk request
+            max_chunk_bytes: Maximum serialized size of a _bulk request
+            concurrency: Number of _bulk requests in flight at once
+            max_retries: Retries for rejected (429) items and failed requests
+            initial_backoff: Seconds to wait before the first retry, doubled each time
+            on_result: Optional callback(work_id, error) called in the calling
+                thread for every document, with error None on success
+
+        Returns:
+            (successful, failures) where failures is a list of (work_id, error)
         """
+        config = current_app.config
+        index = index or config['ELASTICSEARCH_INDEX']
+        chunk_size = chunk_size or config['ELASTICSEARCH_BULK_CHUNK_SIZE']
+        max_chunk_bytes = max_chunk_bytes or config['ELASTICSEARCH_BULK_MAX_BYTES']
+        concurrency = concurrency or config['ELASTICSEARCH_BULK_CONCURRENCY']
+        if max_retries is None:
+            max_retries = config['ELASTICSEARCH_BULK_MAX_RETRIES']
+
         successful = 0
-        failed = 0
+        failures = []
+
+        def collect(future):
+            nonlocal successful
+            for work_id, error in future.result():
+                if error is None:
+                    successful += 1
+                else:
+                    logger.error(f"Error indexing work {work_id}: {error}")
+                    failures.append((work_id, error))
+                if on_result is not None:
+                    on_result(work_id, error)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = set()
+            for chunk in self._bulk_chunks(docs, index, chunk_size, max_chunk_bytes):
+                # Bound the number of serialized chunks held in memory
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                in_flight.add(executor.submit(self._send_bulk, chunk, max_retries, initial_backoff))
+
+            for future in as_completed(in_flight):
+                collect(future)
+
+        logger.info(f"Bulk indexed {successful} works into {index}, {len(failures)} failed")
+        return successful, failures
+
+    def reindex_all(self, works, content_extractor, extract_workers=None, queue_size=None, on_result=None):
+        """
+        Reindex all works through a bounded producer/consumer pipeline.
 
-        with ThreadPoolExecutor(max_workers=current_app.config.get('ELASTICSEARCH_THREAD_POOL_SIZE', 4)) as executor:
-            future_to_work = {}
-            for work in works:
+        The calling thread feeds works into a bounded queue, a pool of
+        extractor threads turns them into (work, content) pairs on a second
+        bounded queue, and an indexing thread drains that queue into
+        bulk_index. Full queues block the stage upstream, so at most
+        ``queue_size`` works and documents are held in memory however large
+        ``works`` is. Pass a lazily evaluated iterable to keep it that way.
+
+        Args:
+            works: Iterable of work objects
+            content_extractor: Function to extract content from a work
+            extract_workers: Number of extractor threads, defaults to
+                ELASTICSEARCH_EXTRACT_WORKERS
+            queue_size: Capacity of each queue between stages, defaults to
+                ELASTICSEARCH_PIPELINE_QUEUE_SIZE
+            on_result: Optional callback(work_id, error), called from the
+                indexing thread for every document sent to Elasticsearch
+        """
+        app = current_app._get_current_object()
+        extract_workers = extract_workers or app.config['ELASTICSEARCH_EXTRACT_WORKERS']
+        queue_size = queue_size or app.config['ELASTICSEARCH_PIPELINE_QUEUE_SIZE']
+
+        work_queue = queue.Queue(maxsize=queue_size)
+        doc_queue = queue.Queue(maxsize=queue_size)
+        done = object()
+        stop = threading.Event()
+        failed_lock = threading.Lock()
+        outcome = {'failed': 0}
+
+        def put(q, item):
+            # Block while the next stage is busy, but give up if the pipeline stopped
+            while not stop.is_set():
                 try:
-                    content = content_extractor(work)
+                    q.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def extract():
+            with app.app_context():
+                while not stop.is_set():
+                    try:
+                        work = work_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if work is done:
+                        break
+
+                    try:
+                        content = content_extractor(work)
+                    except Exception as e:
+                        logger.error(f"Error extracting content for work {work.id}: {str(e)}")
+                        with failed_lock:
+                            outcome['failed'] += 1
+                        continue
                     if content:
-                        future = executor.submit(self.index_work, work, content)
-                        future_to_work[future] = work
-                except Exception as e:
-                    logger.error(f"Error extracting content for work {work.id}: {str(e)}")
-                    failed += 1
-
-            for future in as_completed(future_to_work):
-                work = future_to_work[future]
+                        put(doc_queue, (work, content))
+                put(doc_queue, done)
+
+        def extracted():
+            remaining = extract_workers
+            while remaining and not stop.is_set():
                 try:
-                    if future.result():
-                        successful += 1
-                    else:
-                        failed += 1
-                except Exception as e:
-                    logger.error(f"Error processing work {work.id}: {str(e)}")
-                    failed += 1
-
-        return successful, failed
+                    item = doc_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+
+        def index():
+            try:
+                with app.app_context():
+                    outcome['indexed'] = self.bulk_index(extracted(), on_result=on_result)
+            except Exception as e:
+                logger.error(f"Error in indexing stage: {str(e)}")
+                outcome['error'] = e
+                stop.set()
+
+        threads = [threading.Thread(target=extract, name=f'reindex-extract-{i}', daemon=True)
+                   for i in range(extract_workers)]
+        threads.append(threading.Thread(target=index, name='reindex-bulk', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            for work in works:
+                if not put(work_queue, work):
+                    break
+            for _ in range(extract_workers):
+                put(work_queue, done)
+        except BaseException:
+            # The works iterable failed: stop every stage so the joins below return
+            stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if 'error' in outcome:
+            raise outcome['error']
+
+        successful, failures = outcome['indexed']
+        return successful, outcome['failed'] + len(failures)
 
     def suggest(self, text, field='title', limit=5):
         """Get search suggestions for autocomplete."""
@@ -0,0 +1,40 @@
+from models import db
+from models.work import WorkSection
+from storage import sources
+
+
+def save_sections(work_id, version, sections):
+    """
+    Replace the section index of a work in the current db session.
+
+    ``sections`` is the output of processors.eebo.scan_sections for the
+    source at ``version``.
+    """
+    table = WorkSection.__table__
+    db.session.execute(table.delete().where(table.c.work_id == work_id))
+    if sections:
+        db.session.execute(table.insert(), [
+            {'work_id': work_id, 'position': position, 'title': title[:500], 'div_type': div_type[:50],
+             'start_offset': start, 'end_offset': end, 'source_version': version}
+            for position, (start, end, title, div_type) in enumerate(sections)
+        ])
+
+
+def current_sections(work):
+    """
+    Return the section index of a work in order, or None.
+
+    An index scanned from an older version of the source is ignored, since
+    its byte offsets no longer point at the right elements.
+    """
+    sections = WorkSection.query.filter_by(work_id=work.id).order_by(WorkSection.position).all()
+    if not sections:
+        return None
+    if sections[0].source_version != sources.version(work.id, work.file_path):
+        return None
+    return sections
+
+
+def read_section(work, section):
+    """Return the source bytes of one indexed section, or None if the source is missing."""
+    return sources.read_range(work.id, work.file_path, section.start_offset, section.end_offset)
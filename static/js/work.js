@@ -0,0 +1,66 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Lazy-load work sections as the reader scrolls towards them
+    const pendingSections = document.querySelectorAll('.work-section-pending');
+    if (!pendingSections.length) {
+        return;
+    }
+
+    function renderItem(type, text) {
+        let element;
+        if (type === 'head') {
+            element = document.createElement('h3');
+            element.className = 'poem-heading';
+        } else if (type === 'line') {
+            element = document.createElement('div');
+            element.className = 'poem-line';
+        } else if (type === 'p') {
+            element = document.createElement('p');
+        } else {
+            element = document.createElement('p');
+            element.className = 'error';
+            text = 'Invalid content type: ' + type;
+        }
+        element.textContent = text;
+        return element;
+    }
+
+    function loadSection(section) {
+        section.classList.remove('work-section-pending');
+        section.classList.add('work-section-loading');
+
+        fetch(section.dataset.sectionUrl)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Failed to load section: ' + response.status);
+                }
+                return response.json();
+            })
+            .then(data => {
+                const fragment = document.createDocumentFragment();
+                data.content.forEach(([type, text]) => fragment.appendChild(renderItem(type, text)));
+                section.appendChild(fragment);
+                section.classList.remove('work-section-loading');
+            })
+            .catch(error => {
+                console.error(error);
+                section.classList.remove('work-section-loading');
+                section.classList.add('work-section-pending');
+            });
+    }
+
+    if (!('IntersectionObserver' in window)) {
+        pendingSections.forEach(loadSection);
+        return;
+    }
+
+    const observer = new IntersectionObserver(function(entries) {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                loadSection(entry.target);
+            }
+        });
+    }, { rootMargin: '800px 0px' });
+
+    pendingSections.forEach(section => observer.observe(section));
+});
@@ -0,0 +1,14 @@
+from .pack import PackReader, PackWriter
+from .text_store import TextStore
+from .sources import SourceResolver, resolver_for
+from .render_cache import RenderCache
+from .snapshots import SnapshotStore
+from processors.xml_processor import OUTPUT_VERSION
+
+# Shared instances, configured by init_app like the search client
+sources = SourceResolver()
+render_cache = RenderCache(format_version=OUTPUT_VERSION)
+snapshots = SnapshotStore()
+
+__all__ = ['PackReader', 'PackWriter', 'TextStore', 'SourceResolver', 'resolver_for', 'RenderCache',
+           'SnapshotStore', 'sources', 'render_cache', 'snapshots']
@@ -0,0 +1,227 @@
+# storage/pack.py
+"""
+Append-only pack files addressed by integer key.
+
+A pack is a pair of files: ``<path>.dat`` holds the (optionally compressed)
+blobs back to back, and ``<path>.idx`` holds one fixed-size record per key
+at offset ``key * RECORD_SIZE``. Readers memory-map both files, so looking
+up and reading any key is an index into a mapping with no per-item open()
+or stat(). Rewriting a key appends a new blob and repoints its record.
+An optional ``<path>.mtime`` holds the mtime (ns) of each entry's source,
+so readers can tell whether a packed copy still matches the file.
+
+Readers notice a pack being rewritten by a running writer: they restat it
+at most every REFRESH_INTERVAL seconds and remap it when it has changed,
+and remap at once when a record points past the end of the mapped data.
+"""
+import mmap
+import os
+import struct
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+# offset, stored length, raw length, codec, sha1 of the source
+RECORD = struct.Struct('<QIIB20s3x')
+RECORD_SIZE = RECORD.size
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Source mtime in nanoseconds, 0 when unknown
+MTIME = struct.Struct('<q')
+
+# Seconds between checks for a pack rewritten since it was mapped
+REFRESH_INTERVAL = 1.0
+
+
+def _digest(checksum):
+    """Accept a sha1 as hex string or raw bytes."""
+    if not checksum:
+        return b'\0' * 20
+    if isinstance(checksum, str):
+        return bytes.fromhex(checksum)
+    return checksum
+
+
+class PackWriter:
+    """Writes blobs into a pack; used by one process at a time."""
+
+    def __init__(self, path, compress=True, level=None):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._dat = open(f'{path}.dat', 'ab')
+        idx_path = f'{path}.idx'
+        self._idx = open(idx_path, 'r+b' if os.path.exists(idx_path) else 'w+b')
+        self._mtime = None
+        if not compress:
+            self.codec = CODEC_RAW
+        elif zstandard is not None:
+            self.codec = CODEC_ZSTD
+            self._zstd = zstandard.ZstdCompressor(level=level or 9)
+        else:
+            self.codec = CODEC_ZLIB
+            self.level = level or 6
+
+    def _compress(self, data):
+        if self.codec == CODEC_ZSTD:
+            return self._zstd.compress(data)
+        if self.codec == CODEC_ZLIB:
+            return zlib.compress(data, self.level)
+        return data
+
+    def put(self, key, data, checksum=None, mtime_ns=None):
+        """Store ``data`` (bytes) under an integer key with the checksum and mtime of its source."""
+        stored = self._compress(data)
+        self._dat.seek(0, os.SEEK_END)
+        offset = self._dat.tell()
+        self._dat.write(stored)
+
+        if mtime_ns is not None:
+            if self._mtime is None:
+                mtime_path = f'{self.path}.mtime'
+                self._mtime = open(mtime_path, 'r+b' if os.path.exists(mtime_path) else 'w+b')
+            self._mtime.seek(key * MTIME.size)
+            self._mtime.write(MTIME.pack(mtime_ns))
+
+        self._idx.seek(key * RECORD_SIZE)
+        self._idx.write(RECORD.pack(offset, len(stored), len(data), self.codec, _digest(checksum)))
+
+    def flush(self):
+        # Data before the index, so a record never points at unwritten bytes
+        self._dat.flush()
+        if self._mtime is not None:
+            self._mtime.flush()
+        self._idx.flush()
+
+    def close(self):
+        self.flush()
+        self._dat.close()
+        self._idx.close()
+        if self._mtime is not None:
+            self._mtime.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackReader:
+    """Random-access reads from a pack through memory maps."""
+
+    def __init__(self, path):
+        self.path = path
+        self._dat = self._idx = self._mtime = None
+        self._stamp = None
+        self._checked = 0.0
+        self._open()
+
+    @staticmethod
+    def _map(filename):
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return None
+        with open(filename, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _stat(self):
+        stamp = []
+        for suffix in ('.dat', '.idx', '.mtime'):
+            try:
+                stat = os.stat(f'{self.path}{suffix}')
+                stamp.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _open(self):
+        # Stat first, so a change made while mapping is caught by the next check
+        self._stamp = self._stat()
+        self._checked = time.monotonic()
+        self._dat = self._map(f'{self.path}.dat')
+        self._idx = self._map(f'{self.path}.idx')
+        self._mtime = self._map(f'{self.path}.mtime')
+
+    def refresh(self):
+        """
+        Remap the files to pick up entries written since the reader was opened.
+
+        The old maps are not closed here but dropped, so a read in another
+        thread that still holds one finishes safely.
+        """
+        self._open()
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self._checked < REFRESH_INTERVAL:
+            return
+        self._checked = now
+        if self._stat() != self._stamp:
+            self.refresh()
+
+    def record(self, key):
+        """Return (offset, length, raw_length, codec, checksum hex) for a key, or None."""
+        self._check()
+        start = key * RECORD_SIZE
+        if self._idx is None or key < 0 or start + RECORD_SIZE > len(self._idx):
+            return None
+        offset, length, raw_length, codec, digest = RECORD.unpack_from(self._idx, start)
+        if length == 0 and raw_length == 0 and digest == b'\0' * 20:
+            return None
+        return offset, length, raw_length, codec, digest.hex()
+
+    def __contains__(self, key):
+        return self.record(key) is not None
+
+    def checksum(self, key):
+        record = self.record(key)
+        return record[4] if record else None
+
+    def mtime_ns(self, key):
+        """Return the mtime (ns) recorded for a key's source, or None if unknown."""
+        start = key * MTIME.size
+        mtimes = self._mtime
+        if mtimes is None or key < 0 or start + MTIME.size > len(mtimes):
+            return None
+        return MTIME.unpack_from(mtimes, start)[0] or None
+
+    def get(self, key, checksum=None):
+        """
+        Return the bytes stored under a key, or None.
+
+        If ``checksum`` is given, entries recorded for a different version
+        of the source are treated as missing.
+        """
+        record = self.record(key)
+        if record is None:
+            return None
+        offset, length, raw_length, codec, digest = record
+        if checksum and digest != _digest(checksum).hex():
+            return None
+
+        if self._dat is None or offset + length > len(self._dat):
+            # Written after the data was mapped: remap once, and treat it as missing if still out of range
+            self.refresh()
+            if self._dat is None or offset + length > len(self._dat):
+                return None
+
+        stored = self._dat[offset:offset + length]
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError(f"{self.path} contains zstd data but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(stored, max_output_size=raw_length)
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(stored)
+        return stored
+
+    def close(self):
+        for mapping in (self._dat, self._idx, self._mtime):
+            if mapping is not None:
+                mapping.close()
+        self._dat = self._idx = self._mtime = None
@@ -0,0 +1,108 @@
+# storage/render_cache.py
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """
+    Two-level cache of processed work structures for rendering.
+
+    Entries are keyed by work id, the version of the source (its mtime,
+    or its checksum when read from the corpus archive) and the
+    ``format_version`` of the code that built them, so neither a changed
+    source nor a structure cached before a deploy is served stale. The first level is an in-process LRU
+    bounded by the serialized size of its entries; the second is a
+    directory of zlib-compressed JSON files shared by all workers.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None, format_version=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.format_version = format_version
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.config.setdefault('RENDER_CACHE_DIR', None)
+        self.max_bytes = app.config['RENDER_CACHE_MAX_BYTES']
+        self.directory = app.config['RENDER_CACHE_DIR']
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, work_id):
+        return os.path.join(self.directory, f'{work_id}.json.z')
+
+    def _key(self, version):
+        return f'{self.format_version}:{version}' if self.format_version is not None else version
+
+    def get(self, work_id, version):
+        """Return the cached structure for a work at a source version, or None."""
+        version = self._key(version)
+        with self._lock:
+            entry = self._entries.get(work_id)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(work_id)
+                    return entry[1]
+                self._evict(work_id)
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(work_id), 'rb') as f:
+                raw = zlib.decompress(f.read())
+            payload = json.loads(raw)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Ignoring unreadable render cache entry for work {work_id}: {str(e)}")
+            return None
+
+        if payload.get('version') != version:
+            return None
+        self._remember(work_id, version, payload['data'], len(raw))
+        return payload['data']
+
+    def put(self, work_id, version, data):
+        """Cache a processed structure in memory and, if configured, on disk."""
+        version = self._key(version)
+        raw = json.dumps({'version': version, 'data': data}, separators=(',', ':')).encode('utf-8')
+        if self.directory:
+            try:
+                # Write atomically so concurrent readers never see a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(zlib.compress(raw, 6))
+                os.replace(tmp_path, self._path(work_id))
+            except OSError as e:
+                logger.warning(f"Could not write render cache entry for work {work_id}: {str(e)}")
+
+        # Round-trip through JSON so memory hits look exactly like disk hits
+        data = json.loads(raw)['data']
+        self._remember(work_id, version, data, len(raw))
+        return data
+
+    def _remember(self, work_id, version, data, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._evict(work_id)
+            self._entries[work_id] = (version, data, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+
+    def _evict(self, work_id):
+        entry = self._entries.pop(work_id, None)
+        if entry is not None:
+            self._size -= entry[2]
@@ -0,0 +1,90 @@
+# storage/snapshots.py
+import glob
+import gzip
+import logging
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # snapshots are always available gzipped
+    brotli = None
+
+# File extension of each stored encoding
+ENCODINGS = {'br': 'br', 'gzip': 'gz'}
+
+# Snapshots are served by the web server, which runs as another user
+FILE_MODE = 0o644
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Prebuilt, precompressed HTML of work pages, written by `flask build-snapshots`.
+
+    Every snapshot is stored gzipped, and also brotli-compressed when the
+    brotli package is installed, so either can be sent as is. A snapshot
+    is named after the ETag of the page it holds, so one whose source,
+    metadata or template version has changed is simply never found:
+    staleness costs no more than the stat that looks it up. Files are
+    sharded by work id into ``{directory}/{id // 1000}/``.
+    """
+
+    def __init__(self, directory=None, accel_prefix=None):
+        self.directory = directory
+        self.accel_prefix = accel_prefix
+
+    def init_app(self, app):
+        app.config.setdefault('SNAPSHOT_DIR', None)
+        app.config.setdefault('SNAPSHOT_ACCEL_PREFIX', None)
+        self.directory = app.config['SNAPSHOT_DIR']
+        self.accel_prefix = app.config['SNAPSHOT_ACCEL_PREFIX']
+
+    def relative_path(self, work_id, etag, encoding='gzip'):
+        return os.path.join(str(work_id // 1000), f'{work_id}-{etag}.html.{ENCODINGS[encoding]}')
+
+    def find(self, work_id, etag, encoding='gzip'):
+        """Return the path of the snapshot of a work page at an ETag in an encoding, or None."""
+        if not self.directory:
+            return None
+        path = os.path.join(self.directory, self.relative_path(work_id, etag, encoding))
+        return path if os.path.exists(path) else None
+
+    def encodings(self, work_id, etag):
+        """Return the encodings a current snapshot of a work page is stored in."""
+        return [encoding for encoding in ENCODINGS if self.find(work_id, etag, encoding)]
+
+    @staticmethod
+    def written_encodings():
+        """Return the encodings write() stores a snapshot in."""
+        return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+    def write(self, work_id, etag, html):
+        """Compress and store a rendered page, replacing older snapshots of the work."""
+        bodies = {'gzip': gzip.compress(html, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(html, mode=brotli.MODE_TEXT, quality=11)
+
+        paths = set()
+        for encoding, body in bodies.items():
+            path = os.path.join(self.directory, self.relative_path(work_id, etag, encoding))
+            shard = os.path.dirname(path)
+            os.makedirs(shard, exist_ok=True)
+
+            # Write atomically so the server never sends a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=shard, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            # mkstemp creates files readable by their owner only
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, path)
+            paths.add(path)
+
+        for old_path in glob.glob(os.path.join(shard, f'{work_id}-*.html.*')):
+            if old_path not in paths and not old_path.endswith('.tmp'):
+                try:
+                    os.remove(old_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove stale snapshot {old_path}: {str(e)}")
+        return paths
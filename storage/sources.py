@@ -0,0 +1,168 @@
+# storage/sources.py
+import io
+import logging
+import os
+from .pack import PackReader
+
+logger = logging.getLogger(__name__)
+
+
+class SourceResolver:
+    """
+    Single entry point for reading a work's source XML.
+
+    Works packed into the corpus archive (see pack_corpus.py) are read
+    from its memory-mapped pack; anything else falls back to
+    ``Work.file_path``. Packed works cost no filesystem access, and
+    pack_corpus.py repacks files that change. With ``verify_files`` a
+    packed copy is only used while it matches the file: one stat compares
+    the file's size and mtime with those recorded at packing time, a file
+    edited since then is read from disk until it is repacked, and the
+    packed copy is used as is when the file is unavailable, e.g. on an
+    unmounted drive. Everything is keyed by (work id, file path) so worker
+    processes can use it without ORM objects.
+    """
+
+    def __init__(self, archive_path=None, verify_files=False):
+        self.archive_path = archive_path
+        self.verify_files = verify_files
+        self._archive = None
+        if archive_path is not None:
+            self._open_archive()
+
+    def init_app(self, app):
+        """Open the corpus archive configured for the Flask app, if any."""
+        app.config.setdefault('CORPUS_ARCHIVE_PATH', None)
+        # Stat every packed work's file on each read, for corpora edited without repacking
+        app.config.setdefault('CORPUS_ARCHIVE_VERIFY_FILES', False)
+        self.archive_path = app.config['CORPUS_ARCHIVE_PATH']
+        self.verify_files = app.config['CORPUS_ARCHIVE_VERIFY_FILES']
+        if self.archive_path:
+            self._open_archive()
+
+    def _open_archive(self):
+        if os.path.exists(f'{self.archive_path}.idx'):
+            self._archive = PackReader(self.archive_path)
+
+    def refresh(self):
+        """Pick up works packed since the archive was opened."""
+        if self._archive is not None:
+            self._archive.refresh()
+        elif self.archive_path:
+            self._open_archive()
+
+    def _packed(self, work_id, file_path):
+        """Return (checksum, file stat or None) if the packed copy of a work is current, else None."""
+        if self._archive is None:
+            return None
+        record = self._archive.record(work_id)
+        if record is None:
+            return None
+        if not self.verify_files:
+            return record[4], None
+        try:
+            stat = os.stat(file_path)
+        except (OSError, TypeError):
+            return record[4], None
+        mtime_ns = self._archive.mtime_ns(work_id)
+        if stat.st_size != record[2] or (mtime_ns is not None and stat.st_mtime_ns != mtime_ns):
+            return None
+        return record[4], stat
+
+    def in_archive(self, work_id, file_path=None):
+        return self._packed(work_id, file_path) is not None
+
+    def checksum(self, work_id, file_path=None):
+        """Return the sha1 recorded for a packed work, or None if it isn't packed or is stale."""
+        packed = self._packed(work_id, file_path)
+        return packed[0] if packed else None
+
+    def stamp(self, work_id, file_path):
+        """
+        Return (version, mtime) for a work's source, or None if missing.
+
+        Current packed works are identified by their checksum, other files
+        by their mtime and size; either way it costs at most a single stat.
+        The mtime of a packed work is None unless files are verified.
+        """
+        packed = self._packed(work_id, file_path)
+        if packed is not None:
+            checksum, stat = packed
+            return checksum, stat.st_mtime if stat is not None else None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return f'{stat.st_mtime_ns}-{stat.st_size}', stat.st_mtime
+
+    def version(self, work_id, file_path):
+        """Return a string identifying the current version of a work's source, or None if missing."""
+        stamp = self.stamp(work_id, file_path)
+        return stamp[0] if stamp else None
+
+    def exists(self, work_id, file_path):
+        return self.in_archive(work_id, file_path) or os.path.exists(file_path)
+
+    def _read_packed(self, work_id, file_path):
+        """Return the packed bytes of a work if they are current and readable, else None."""
+        packed = self._packed(work_id, file_path)
+        if packed is None:
+            return None
+        try:
+            return self._archive.get(work_id, checksum=packed[0])
+        except Exception as e:
+            # A damaged entry must not hide a good file on disk
+            logger.warning(f"Could not read work {work_id} from the corpus archive: {str(e)}")
+            return None
+
+    def read(self, work_id, file_path):
+        """Return the source bytes of a work, or None if it can't be found."""
+        data = self._read_packed(work_id, file_path)
+        if data is not None:
+            return data
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def read_range(self, work_id, file_path, start, end):
+        """
+        Return bytes ``start:end`` of a work's source, or None if it can't be found.
+
+        Loose files are read with a single seek, so the cost is the size of
+        the range rather than of the file.
+        """
+        data = self._read_packed(work_id, file_path)
+        if data is not None:
+            return data[start:end]
+        try:
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                return f.read(end - start)
+        except OSError:
+            return None
+
+    def open(self, work_id, file_path):
+        """Return a binary file object for a work's source, for parsers that stream."""
+        data = self._read_packed(work_id, file_path)
+        if data is not None:
+            return io.BytesIO(data)
+        return open(file_path, 'rb')
+
+
+_worker_resolvers = {}
+
+
+def resolver_for(archive_path, verify_files=True):
+    """
+    Return a per-process resolver for an archive path, for use in worker processes.
+
+    Batch stages work on files that have just changed, so their resolvers
+    verify packed copies against the files by default.
+    """
+    key = (archive_path, verify_files)
+    resolver = _worker_resolvers.get(key)
+    if resolver is None:
+        resolver = _worker_resolvers[key] = SourceResolver(archive_path, verify_files=verify_files)
+    return resolver
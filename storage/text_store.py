@@ -0,0 +1,51 @@
+# storage/text_store.py
+from .pack import PackReader, PackWriter
+
+
+class TextStore:
+    """
+    Compressed store of extracted work text, addressed by Work.id.
+
+    Each entry carries the sha1 of the source file it was extracted from,
+    so a lookup with the current checksum only returns text that is still
+    up to date. Reads go through memory maps; writes append to the pack and
+    should come from a single process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._reader = None
+        self._writer = None
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = PackReader(self.path)
+        return self._reader
+
+    def get(self, work_id, checksum=None):
+        """Return the stored text of a work, or None if missing or stale."""
+        data = self.reader.get(work_id, checksum=checksum)
+        return data.decode('utf-8') if data is not None else None
+
+    def checksum(self, work_id):
+        return self.reader.checksum(work_id)
+
+    def put(self, work_id, text, checksum):
+        if self._writer is None:
+            self._writer = PackWriter(self.path)
+        self._writer.put(work_id, text.encode('utf-8'), checksum)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+        if self._reader is not None:
+            self._reader.refresh()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('elasticsearch')
+pytest.importorskip('flask')
+
+from search import SearchClient  # noqa: E402
+
+
+def make_work(work_id=1):
+    return SimpleNamespace(id=work_id, title='The Tragedie of Hamlet', author='Shakespeare',
+                           publication_year=1603, tcp_id='A12345', collection='EEBO-TCP',
+                           language='eng', genre=None, source_library=None)
+
+
+def test_work_document_serializes_indexed_date_as_iso_8601():
+    document = SearchClient().work_document(make_work(), 'loue and honour')
+    indexed_date = json.loads(json.dumps(document))['indexed_date']
+    assert 'T' in indexed_date
+    datetime.fromisoformat(indexed_date)
+
+
+def test_bulk_chunks_contain_parseable_documents():
+    client = SearchClient()
+    docs = [(make_work(1), 'loue and honour'), (make_work(2), 'ye booke', 'the book')]
+    chunks = list(client._bulk_chunks(docs, 'works', chunk_size=10, max_chunk_bytes=1024 * 1024))
+
+    assert len(chunks) == 1
+    sources = [json.loads(source) for _, _, source in chunks[0]]
+    assert [source['content_normalized'] for source in sources] == ['love and honor', 'the book']
+    for source in sources:
+        datetime.fromisoformat(source['indexed_date'])
+
+
+def test_reindex_all_stops_when_works_raise():
+    import threading
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.config.update(ELASTICSEARCH_EXTRACT_WORKERS=2, ELASTICSEARCH_PIPELINE_QUEUE_SIZE=2)
+    client = SearchClient()
+    client.bulk_index = lambda docs, on_result=None: (sum(1 for _ in docs), [])
+
+    def works():
+        for work_id in range(1, 4):
+            yield make_work(work_id)
+        raise RuntimeError('database went away')
+
+    errors = []
+
+    def run():
+        with app.app_context():
+            try:
+                client.reindex_all(works(), lambda work: 'loue')
+            except RuntimeError as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ['database went away']
@@ -1,23 +1,20 @@
 # update_publication_years.py
 
+import hashlib
 import os
-import xml.etree.ElementTree as ET
+import csv
+import concurrent.futures
+from sqlalchemy import bindparam
 from models import db
 from models.work import Work
 from flask import current_app
+from processors import eebo
+from ingest_ledger import StageLedger, forget_works
+from storage import sources, resolver_for
 import logging
+from script_logging import setup_logging, run_log_filename, worker_logging
 from datetime import datetime
 
-# Set up logging
-log_filename = f"publication_years_update_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # Define the EEBO texts directory
@@ -27,77 +24,83 @@ EEBO_DIR = "/Volumes/seagate_portable/eebo-tcp-texts"
 def extract_publication_year(header):
     """Extract publication year from multiple possible locations in EEBO-TCP XML."""
     try:
-        # Try sourceDesc/biblFull/publicationStmt/date first (most authoritative)
-        date_elem = header.find(
-            './/{http://www.tei-c.org/ns/1.0}sourceDesc//{http://www.tei-c.org/ns/1.0}biblFull//{http://www.tei-c.org/ns/1.0}publicationStmt//{http://www.tei-c.org/ns/1.0}date')
-
-        # If not found, try editionStmt/edition/date
-        if date_elem is None:
-            date_elem = header.find(
-                './/{http://www.tei-c.org/ns/1.0}editionStmt//{http://www.tei-c.org/ns/1.0}edition//{http://www.tei-c.org/ns/1.0}date')
-
-        if date_elem is not None:
-            # Try 'when' attribute first
-            year = date_elem.get('when')
-            if not year:
-                # If no 'when' attribute, try text content
-                year = date_elem.text
-
-            # Clean up the year string
-            if year:
-                # Remove any punctuation
-                year = year.strip('.')
-                # Extract just the year if it's a longer date
-                import re
-                year_match = re.search(r'\b(\d{4})\b', year)
-                if year_match:
-                    return int(year_match.group(1))
-
-                # If it's just a year number
-                if year.isdigit() and len(year) == 4:
-                    return int(year)
-
+        return eebo.extract_publication_year(header)
     except (ValueError, AttributeError, TypeError) as e:
         logger.error(f"Error extracting year: {str(e)}")
 
     return None
 
 
+def resolve_path(file_path):
+    """Get the relative path from the database and make it absolute."""
+    if file_path.startswith('/Volumes'):
+        return file_path  # Already absolute
+    return os.path.join(EEBO_DIR, os.path.basename(file_path))
+
+
+class HashingReader:
+    """Binary file wrapper that feeds every byte read into a hash."""
+
+    def __init__(self, source, digest):
+        self.source = source
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.digest.update(data)
+        return data
+
+
+def read_header_with_fingerprint(resolver, work_id, abs_path):
+    """
+    Return (header, ledger fingerprint) for a work, reading its source through the resolver.
+
+    Only the few KB up to the end of the header are read. Packed works are
+    identified by the checksum recorded in the corpus archive, loose files
+    by the sha1 of the bytes read, which hold everything the year comes
+    from. Works with no file on disk have no fingerprint.
+    """
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        stat = None
+    checksum = resolver.checksum(work_id, abs_path)
+    digest = hashlib.sha1()
+    with resolver.open(work_id, abs_path) as source:
+        header = eebo.read_header(source if checksum else HashingReader(source, digest))
+    if stat is None:
+        return header, None
+    return header, (stat.st_size, stat.st_mtime, checksum or digest.hexdigest())
+
+
 def update_work_publication_year(work):
-    """Update publication year for a single work."""
+    """Update publication year for a single work; returns (updated, ledger fingerprint)."""
     try:
-        # Get the relative path from the database and make it absolute
-        rel_path = work.file_path
-        if rel_path.startswith('/Volumes'):
-            abs_path = rel_path  # Already absolute
-        else:
-            abs_path = os.path.join(EEBO_DIR, os.path.basename(rel_path))
+        abs_path = resolve_path(work.file_path)
 
-        if not os.path.exists(abs_path):
+        if not sources.exists(work.id, abs_path):
             logger.error(f"File not found: {abs_path}")
-            return False
+            return False, None
 
-        tree = ET.parse(abs_path)
-        root = tree.getroot()
-        header = root.find('.//{http://www.tei-c.org/ns/1.0}teiHeader')
+        header, fingerprint = read_header_with_fingerprint(sources, work.id, abs_path)
 
         if header is None:
             logger.error(f"No header found in {abs_path}")
-            return False
+            return False, None
 
         pub_year = extract_publication_year(header)
         if pub_year:
             old_year = work.publication_year
             work.publication_year = pub_year
             logger.info(f"Updated work {work.id}: {work.title} - Year changed from {old_year} to {pub_year}")
-            return True
+            return True, fingerprint
         else:
             logger.warning(f"No year found for work {work.id}: {work.title}")
-            return False
+            return False, None
 
     except Exception as e:
         logger.error(f"Error processing work {work.id}: {str(e)}")
-        return False
+        return False, None
 
 
 def update_all_publication_years():
@@ -114,18 +117,32 @@ def update_all_publication_years():
         total_works = len(works)
         logger.info(f"Found {total_works} EEBO-TCP works to process")
 
+        ledger = StageLedger('publication_year')
         updated = 0
         failed = 0
         no_year = 0
+        unchanged = 0
 
         # Process works in batches to manage memory and allow partial commits
         batch_size = 100
         for i in range(0, total_works, batch_size):
             batch = works[i:i + batch_size]
+            changed_ids = []
 
             for work in batch:
                 try:
-                    if update_work_publication_year(work):
+                    abs_path = resolve_path(work.file_path)
+                    if os.path.exists(abs_path) and not ledger.needs_processing(abs_path):
+                        unchanged += 1
+                        continue
+
+                    old_year = work.publication_year
+                    year_updated, fingerprint = update_work_publication_year(work)
+                    if work.publication_year != old_year:
+                        changed_ids.append(work.id)
+                    if year_updated:
+                        if fingerprint:
+                            ledger.mark_done(abs_path, work_id=work.id, fingerprint=fingerprint)
                         updated += 1
                     else:
                         no_year += 1
@@ -135,24 +152,170 @@ def update_all_publication_years():
 
             # Commit each batch
             try:
+                # The search index holds the year too, so the next index run must redo these works
+                forget_works('index', changed_ids)
+                ledger.flush()
                 db.session.commit()
+                ledger.committed()
                 logger.info(f"Processed {min(i + batch_size, total_works)}/{total_works} works "
                             f"({(min(i + batch_size, total_works) / total_works) * 100:.1f}%)")
             except Exception as e:
                 logger.error(f"Error committing batch: {str(e)}")
                 db.session.rollback()
+                ledger.discard()
                 failed += len(batch)
 
         logger.info(f"""
 Update complete:
 - Total works processed: {total_works}
 - Successfully updated: {updated}
+- Unchanged since last run: {unchanged}
 - No year found: {no_year}
 - Failed to process: {failed}
 """)
 
 
+def read_year_from_file(work_id, abs_path, archive_path=None):
+    """
+    Return (year, error, fingerprint) for a work from its header; runs in a worker process.
+
+    The fingerprint for the ledger is computed here too, so the main
+    process never hashes files; it is None for archive-only works.
+    """
+    try:
+        header, fingerprint = read_header_with_fingerprint(resolver_for(archive_path), work_id, abs_path)
+        if header is None:
+            return None, "No header found", fingerprint
+        return eebo.extract_publication_year(header), None, fingerprint
+    except Exception as e:
+        return None, str(e), None
+
+
+def iter_work_paths(batch_size=5000):
+    """Yield (id, tcp_id, absolute path, publication_year) for EEBO-TCP works, paged by id."""
+    last_id = 0
+    while True:
+        rows = db.session.query(Work.id, Work.tcp_id, Work.file_path, Work.publication_year) \
+            .filter(Work.collection == 'EEBO-TCP', Work.id > last_id) \
+            .order_by(Work.id).limit(batch_size).all()
+        if not rows:
+            return
+        for work_id, tcp_id, file_path, pub_year in rows:
+            yield work_id, tcp_id, resolve_path(file_path), pub_year
+        last_id = rows[-1][0]
+
+
+def backfill_publication_years(app, workers=None, batch_size=1000):
+    """
+    Backfill publication years on a process pool with bulk UPDATEs.
+
+    Only ids and paths are read from the database. Years are read from the
+    file headers in worker processes, and changed years are written with
+    executemany UPDATE statements of ``batch_size`` rows. Every changed,
+    missing or failed year is listed in a CSV summary next to the log.
+    """
+    workers = workers or os.cpu_count() or 1
+    summary_filename = f"publication_years_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    logger.info(f"Starting publication year backfill with {workers} processes")
+
+    with app.app_context():
+        ledger = StageLedger('publication_year')
+        update_stmt = Work.__table__.update() \
+            .where(Work.__table__.c.id == bindparam('work_id')) \
+            .values(publication_year=bindparam('year'))
+
+        counts = {'changed': 0, 'same': 0, 'missing': 0, 'failed': 0, 'unchanged': 0}
+        updates = []
+
+        def apply_updates():
+            try:
+                if updates:
+                    db.session.execute(update_stmt, updates)
+                    # The search index holds the year too, so the next index run must redo these works
+                    forget_works('index', [update['work_id'] for update in updates])
+                ledger.flush()
+                db.session.commit()
+                ledger.committed()
+            except Exception as e:
+                logger.error(f"Error applying batch of {len(updates)} updates: {str(e)}")
+                db.session.rollback()
+                ledger.discard()
+                counts['failed'] += len(updates)
+                counts['changed'] -= len(updates)
+
+        # Skip files whose header hasn't changed since the last successful run
+        works = []
+        for work_id, tcp_id, abs_path, pub_year in iter_work_paths():
+            if os.path.exists(abs_path) and not ledger.needs_processing(abs_path):
+                counts['unchanged'] += 1
+            else:
+                works.append((work_id, tcp_id, abs_path, pub_year))
+        logger.info(f"Found {len(works)} works to process ({counts['unchanged']} unchanged since last run)")
+
+        with open(summary_filename, 'w', newline='') as summary_file, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers, **worker_logging()) as executor:
+            summary = csv.writer(summary_file)
+            summary.writerow(['work_id', 'tcp_id', 'file_path', 'old_year', 'new_year', 'status', 'error'])
+
+            chunksize = max(1, min(64, len(works) // (workers * 4) or 1))
+            archive_path = app.config.get('CORPUS_ARCHIVE_PATH')
+            results = executor.map(read_year_from_file,
+                                   [work_id for work_id, _, _, _ in works],
+                                   [abs_path for _, _, abs_path, _ in works],
+                                   [archive_path] * len(works),
+                                   chunksize=chunksize)
+            for done, ((work_id, tcp_id, abs_path, old_year), (year, error, fingerprint)) \
+                    in enumerate(zip(works, results), 1):
+                if error:
+                    status = 'failed'
+                elif not year:
+                    status = 'missing'
+                elif year == old_year:
+                    status = 'same'
+                else:
+                    status = 'changed'
+                    updates.append({'work_id': work_id, 'year': year})
+
+                counts[status] += 1
+                if status != 'same':
+                    summary.writerow([work_id, tcp_id, abs_path, old_year, year, status, error or ''])
+                if status in ('same', 'changed') and fingerprint:
+                    ledger.mark_done(abs_path, work_id=work_id, fingerprint=fingerprint)
+
+                if len(updates) >= batch_size or done % batch_size == 0:
+                    apply_updates()
+                    updates = []
+                    logger.info(f"Processed {done}/{len(works)} works ({done / len(works) * 100:.1f}%)")
+
+            apply_updates()
+
+        logger.info(f"""
+Backfill complete:
+- Total works: {len(works) + counts['unchanged']}
+- Year changed: {counts['changed']}
+- Year already correct: {counts['same']}
+- Unchanged since last run: {counts['unchanged']}
+- No year found: {counts['missing']}
+- Failed to process: {counts['failed']}
+- Summary written to: {summary_filename}
+""")
+        return counts
+
+
 if __name__ == "__main__":
+    import argparse
     from app import app
 
-    update_all_publication_years()
\ No newline at end of file
+    setup_logging(run_log_filename('publication_years_update'))
+
+    parser = argparse.ArgumentParser(description="Update publication years of EEBO-TCP works")
+    parser.add_argument('--backfill', action='store_true',
+                        help="Read years on a process pool and apply them with bulk UPDATEs")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes for --backfill (defaults to the CPU count)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_publication_years(app, workers=args.workers)
+    else:
+        update_all_publication_years()
\ No newline at end of file